@@ -1,46 +1,283 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, url_for
 import feedparser
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate, upgrade
+from filelock import FileLock, Timeout as FileLockTimeout
 from flask_caching import Cache
+from flask.json.tag import TaggedJSONSerializer, JSONTag
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
 from dateutil.parser import parse
 from dateutil.tz import tzutc
-from requests.exceptions import Timeout
 import pytz
 import json
+import re
 import requests
+import redis
 import html
 import os
 import aiohttp
+from aiohttp import web
 import asyncio
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+import queue
+import threading
+import time
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.events import EVENT_JOB_MISSED
 from asgiref.wsgi import WsgiToAsgi
 import logging
-import urllib
-from transformers import BartTokenizer, BartForConditionalGeneration
-from transformers import T5Tokenizer, T5ForConditionalGeneration
+import urllib.parse
 import traceback
+import gc
+import pickle
+import tracemalloc
+import hashlib
+import random
+import socket
+import atexit
+import contextlib
+import email.utils
+import functools
+import zlib
+import uuid
+import click
+from collections import Counter
 from http.client import IncompleteRead
 from dateutil.tz import gettz
 from dateutil.parser import ParserError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 
-#AI models
-english_model = BartForConditionalGeneration.from_pretrained('facebook/bart-large-cnn')
-english_tokenizer = BartTokenizer.from_pretrained('facebook/bart-large-cnn')
-japanese_tokenizer = T5Tokenizer.from_pretrained('tsmatz/mt5_summarize_japanese')
-japanese_model = T5ForConditionalGeneration.from_pretrained('tsmatz/mt5_summarize_japanese')
+#AI models: (checkpoint, tokenizer class, model class) from transformers
+SUMMARY_MODELS = {
+    'english': ('facebook/bart-large-cnn', 'BartTokenizer', 'BartForConditionalGeneration'),
+    'japanese': ('tsmatz/mt5_summarize_japanese', 'T5Tokenizer', 'T5ForConditionalGeneration'),
+}
+MODEL_PREWARM = os.environ.get('MODEL_PREWARM', '0') == '1'  # Load every model in the background at startup
+MODEL_IDLE_UNLOAD = timedelta(minutes=int(os.environ.get('MODEL_IDLE_UNLOAD_MINUTES', '60')))  # 0 keeps models loaded
+SUMMARY_QUANTIZE = os.environ.get('SUMMARY_QUANTIZE', '0') == '1'  # Run the models as dynamically quantized int8 on CPU
+
+#Loads a model and its tokenizer, optionally quantizing the Linear layers of the model to int8
+def load_summary_model(name, quantize=False):
+    import transformers  # Imported here so that starting the app or the flask CLI does not pay for it
+    checkpoint, tokenizer_class, model_class = SUMMARY_MODELS[name]
+    tokenizer = getattr(transformers, tokenizer_class).from_pretrained(checkpoint)
+    model = getattr(transformers, model_class).from_pretrained(checkpoint)
+    model.eval()
+    if quantize:
+        model = quantize_model(model)
+    return model, tokenizer
+
+#Dynamic int8 quantization only exists for CPU inference
+def quantize_model(model):
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+#Size of the weights of a model, quantized layers included (their packed weights are not parameters)
+def model_memory_bytes(model):
+    import torch
+    total = 0
+    for value in model.state_dict().values():
+        tensors = value if isinstance(value, tuple) else (value,)
+        for tensor in tensors:
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+#Loads each AI model the first time it is needed and unloads models that have been idle for a while
+class ModelRegistry:
+    def __init__(self, specs, quantize=False):
+        self.specs = specs
+        self.quantize = quantize
+        self.loaded = {}  # name -> (model, tokenizer)
+        self.stats = {name: {'checkpoint': spec[0], 'loaded': False} for name, spec in specs.items()}
+        self.locks = {name: threading.Lock() for name in specs}
+
+    #Returns (model, tokenizer), loading them first if needed
+    def get(self, name):
+        loaded = self.loaded.get(name)
+        if loaded is None:
+            with self.locks[name]:  # Only one thread loads a given model
+                loaded = self.loaded.get(name)
+                if loaded is None:
+                    loaded = self.load(name)
+        self.stats[name]['last_used'] = time.time()
+        return loaded
+
+    def load(self, name):
+        import torch
+        quantize = self.quantize and not torch.cuda.is_available()
+        logging.info(f"Loading {name} model {self.specs[name][0]}{' (int8)' if quantize else ''}...")
+        start = time.monotonic()
+        model, tokenizer = load_summary_model(name, quantize=quantize)
+        load_seconds = time.monotonic() - start
+        memory_bytes = model_memory_bytes(model)
+        self.stats[name].update(loaded=True, quantized=quantize, load_seconds=round(load_seconds, 2), memory_mb=round(memory_bytes / 2**20, 1), loaded_at=time.time())
+        logging.info(f"Loaded {name} model in {load_seconds:.1f}s ({memory_bytes / 2**20:.0f} MB)")
+        self.loaded[name] = (model, tokenizer)
+        return self.loaded[name]
+
+    #Loads the given models (all by default) in a background thread
+    def prewarm(self, names=None):
+        def run():
+            for name in names or self.specs:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    logging.error(f"Could not prewarm {name} model: {e}")
+        threading.Thread(target=run, name='model-prewarm', daemon=True).start()
+
+    #Drops the models that have not been used for max_idle
+    def unload_idle(self, max_idle):
+        now = time.time()
+        for name in list(self.loaded):
+            with self.locks[name]:
+                if name in self.loaded and now - self.stats[name].get('last_used', 0) > max_idle.total_seconds():
+                    del self.loaded[name]  # A batch still running keeps its own reference until it ends
+                    self.stats[name]['loaded'] = False
+                    logging.info(f"Unloaded idle {name} model")
+        gc.collect()
+
+    def status(self):
+        return {name: dict(stats) for name, stats in self.stats.items()}
+
+model_registry = ModelRegistry(SUMMARY_MODELS, quantize=SUMMARY_QUANTIZE)
+
+#Used by the scheduler to free the memory of idle models
+def unload_idle_models():
+    if MODEL_IDLE_UNLOAD:
+        model_registry.unload_idle(MODEL_IDLE_UNLOAD)
 
 #Logging to capture all messages of level INFO
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Filesystem cache
+#Compact record of a feed entry with only the fields the templates and routes use, built once at ingest
+#instead of caching the whole feedparser entry (summary_detail, links, tags, media blobs...)
+#Like the feedparser entries it replaces it supports entry['field'], entry.get('field') and 'field' in entry
+class FeedEntry:
+    __slots__ = ('title', 'link', 'summary', 'published', 'updated', 'published_parsed', 'publish_date',
+                 'image_url', 'original_link', 'source_fingerprint', 'article')
+    TEXT_FIELDS = ('title', 'link', 'summary', 'published', 'updated')  # Rendered as '' when the feed has none
+
+    def __init__(self, **fields):
+        for field in self.__slots__:
+            setattr(self, field, fields.get(field, '' if field in self.TEXT_FIELDS else None))
+
+    #Copies the used fields of a feedparser entry (or of another FeedEntry)
+    @classmethod
+    def from_entry(cls, entry):
+        fields = {field: entry.get(field) for field in cls.__slots__ if entry.get(field) is not None}
+        if 'link' not in fields and entry.get('path'):
+            fields['link'] = entry.get('path')  # UNEP entries have a path instead of a link
+        return cls(**fields)
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and getattr(self, key) not in (None, '')
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    #Fields stored by the Redis serializer, the Article row is only attached while rendering
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__ if field != 'article'}
+
+#Values stored in Redis are tagged JSON instead of pickle, zlib compressed when they are large:
+#one format version byte, then b'j' + JSON or b'z' + compressed JSON. Integers are stored as plain
+#digits like the default Redis serializer does, values in an unknown format are read as cache misses
+CACHE_FORMAT_VERSION = b'\x01'
+CACHE_COMPRESS_MIN_BYTES = 1024
+
+#Feed entries keep their attribute access (entry.link) when they are read back
+class FeedParserDictTag(JSONTag):
+    key = ' fp'
+
+    def check(self, value):
+        return isinstance(value, feedparser.FeedParserDict)
+
+    def to_json(self, value):
+        return {key: self.serializer.tag(item) for key, item in value.items()}
+
+    def to_python(self, value):
+        return feedparser.FeedParserDict(value)
+
+class FeedEntryTag(JSONTag):
+    key = ' fe'
+
+    def check(self, value):
+        return isinstance(value, FeedEntry)
+
+    def to_json(self, value):
+        return {key: self.serializer.tag(item) for key, item in value.to_dict().items()}
+
+    def to_python(self, value):
+        return FeedEntry(**value)
+
+#Flask's own datetime tag uses HTTP dates, which drop the microseconds and make naive publish dates aware
+class DateTimeTag(JSONTag):
+    key = ' dt'
+
+    def check(self, value):
+        return isinstance(value, datetime)
+
+    def to_json(self, value):
+        return value.isoformat()
+
+    def to_python(self, value):
+        return datetime.fromisoformat(value)
+
+class CompactSerializer:
+    def __init__(self):
+        self.json = TaggedJSONSerializer()
+        self.json.register(DateTimeTag, index=0)
+        self.json.register(FeedParserDictTag, index=0)
+        self.json.register(FeedEntryTag, index=0)
+
+    def dumps(self, value):
+        if type(value) is int:
+            return str(value).encode('ascii')
+        data = self.json.dumps(value).encode('utf-8')
+        if len(data) >= CACHE_COMPRESS_MIN_BYTES:
+            return CACHE_FORMAT_VERSION + b'z' + zlib.compress(data)
+        return CACHE_FORMAT_VERSION + b'j' + data
+
+    def loads(self, value):
+        if value is None:
+            return None
+        if value[:1] == CACHE_FORMAT_VERSION:
+            data = value[2:]
+            if value[1:2] == b'z':
+                data = zlib.decompress(data)
+            return self.json.loads(data.decode('utf-8'))
+        try:
+            return int(value)
+        except ValueError:
+            return None  # Pickled by an older version, rebuilt on the next refresh
+
+# Filesystem cache, or a Redis server shared by every worker and node when CACHE_REDIS_URL is set
 cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
 os.makedirs(cache_dir, exist_ok=True)
-cache = Cache(config={'CACHE_TYPE': 'filesystem', 'CACHE_DIR': cache_dir})
-cache_ready = False
+lock_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locks')  # Kept out of cache_dir, which Flask-Caching prunes
+os.makedirs(lock_dir, exist_ok=True)
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')  # e.g. redis://localhost:6379/0
+CACHE_THRESHOLD = 100000  # Max number of files in the cache directory (cachelib's default is 500)
+if CACHE_REDIS_URL:
+    cache = Cache(config={'CACHE_TYPE': 'RedisCache', 'CACHE_REDIS_URL': CACHE_REDIS_URL, 'CACHE_KEY_PREFIX': 'bywym:'})
+else:
+    # Past CACHE_THRESHOLD files cachelib evicts by expiry and the timeout=0 entries (feeds, home timeline) go first,
+    # so the threshold is kept far above what the short-lived comment pages, jobs and rendered pages reach
+    cache = Cache(config={'CACHE_TYPE': 'filesystem', 'CACHE_DIR': cache_dir, 'CACHE_THRESHOLD': CACHE_THRESHOLD})
+cache_ready = False  # Set by the leader once the first refresh has finished with at least one feed refreshed
 
 def my_listener(event):
     if event.code == EVENT_JOB_MISSED:
@@ -56,16 +293,499 @@ URLS = [
     'https://search.cnbc.com/rs/search/combinedcms/view.xml?partnerId=wrss01&id=100003114'
 ]
 
-#Makes an asynchronous GET request to specified URLs
+#Every outbound request (feeds and article pages, sync and async) goes through host_limiter, which caps the
+#requests in flight per host, spaces their starts, and backs off from hosts that answer 403, 429 or 5xx or fail
+HOST_MAX_CONCURRENCY = 4  # Requests in flight per host
+HOST_MIN_INTERVAL = 0.1  # Seconds between the starts of two requests to the same host
+HOST_LIMITS = {  # (max concurrency, min interval) for hosts that block fast crawlers with 403
+    'www.politico.com': (1, 1.0),
+    'rss.politico.com': (1, 1.0),
+    'www.webmd.com': (1, 1.0),
+    'rssfeeds.webmd.com': (1, 1.0),
+}
+HOST_BACKOFF_BASE = 2  # Seconds of the first backoff, doubled after every failure in a row
+HOST_BACKOFF_MAX = 300  # Longest backoff when the server did not send Retry-After
+HOST_MAX_WAIT = 30  # Requests that would wait longer than this for a host fail at once with HostBackoff
+HOST_POLL_INTERVAL = 0.05  # Seconds between two checks for a free slot
+
+#Raised instead of waiting when a host is backed off for longer than HOST_MAX_WAIT
+class HostBackoff(requests.exceptions.RequestException):
+    pass
+
+#Seconds asked for by a Retry-After header, which holds either seconds or an HTTP date
+def retry_after_seconds(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=pytz.UTC)
+    return max(0.0, (retry_at - datetime.now(pytz.UTC)).total_seconds())
+
+#Outcome of a request, set by the caller with done() before its slot is released
+class HostSlot:
+    def __init__(self):
+        self.status = None  # None means the request failed without a response
+        self.retry_after = None
+
+    def done(self, status, retry_after=None):
+        self.status = status
+        self.retry_after = retry_after_seconds(retry_after)
+
+class HostLimiter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.counters = {}
+
+    def state(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = {'active': 0, 'next_start': 0.0, 'blocked_until': 0.0, 'failures': 0}
+            self.counters[host] = Counter()
+        return self.hosts[host]
+
+    # Takes a slot and returns 0 when a request to `host` may start now, else the seconds to wait before asking again
+    def reserve(self, host):
+        with self.lock:
+            state = self.state(host)
+            max_active, min_interval = HOST_LIMITS.get(host, (HOST_MAX_CONCURRENCY, HOST_MIN_INTERVAL))
+            now = time.monotonic()
+            if state['blocked_until'] - now > HOST_MAX_WAIT:
+                self.counters[host]['rejected'] += 1
+                raise HostBackoff(f"{host} is backed off for {state['blocked_until'] - now:.0f}s")
+            wait = max(state['blocked_until'] - now, state['next_start'] - now, 0.0)
+            if wait == 0 and state['active'] < max_active:
+                state['active'] += 1
+                state['next_start'] = now + min_interval
+                self.counters[host]['requests'] += 1
+                return 0
+            wait = wait or HOST_POLL_INTERVAL
+            self.counters[host]['wait_seconds'] += wait
+            return wait
+
+    # Frees the slot and backs off from the host when the request failed or was refused
+    def release(self, host, slot):
+        with self.lock:
+            state = self.state(host)
+            state['active'] -= 1
+            counters = self.counters[host]
+            if slot.status is not None and slot.status < 400:
+                counters['ok'] += 1
+                state['failures'] = 0
+                return
+            if slot.status is None:
+                counters['errors'] += 1
+            elif slot.status == 403:
+                counters['forbidden'] += 1
+            elif slot.status in (429, 503):
+                counters['throttled'] += 1
+            elif slot.status >= 500:
+                counters['server_errors'] += 1
+            else:
+                counters['client_errors'] += 1  # 404 and the like say nothing about the load of the host
+                return
+            state['failures'] += 1
+            delay = slot.retry_after
+            if delay is None:
+                delay = min(HOST_BACKOFF_MAX, HOST_BACKOFF_BASE * 2 ** (state['failures'] - 1))
+            state['blocked_until'] = max(state['blocked_until'], time.monotonic() + delay)
+            counters['backoffs'] += 1
+            logging.warning(f"Backing off from {host} for {delay:.0f}s (status {slot.status})")
+
+    # with host_limiter.slot(url) as slot: ... slot.done(response.status_code, response.headers.get('Retry-After'))
+    @contextlib.contextmanager
+    def slot(self, url):
+        host = urllib.parse.urlparse(url).netloc
+        while True:
+            wait = self.reserve(host)
+            if not wait:
+                break
+            time.sleep(wait)
+        slot = HostSlot()
+        try:
+            yield slot
+        finally:
+            self.release(host, slot)
+
+    # Async version of slot, waits without blocking the event loop
+    @contextlib.asynccontextmanager
+    async def async_slot(self, url):
+        host = urllib.parse.urlparse(url).netloc
+        while True:
+            wait = self.reserve(host)
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+        slot = HostSlot()
+        try:
+            yield slot
+        finally:
+            self.release(host, slot)
+
+    # Per-host counters and current backoff, for /hosts
+    def status(self):
+        with self.lock:
+            now = time.monotonic()
+            return {host: dict(self.counters[host], active=state['active'],
+                               backoff_seconds=round(max(0.0, state['blocked_until'] - now), 1))
+                    for host, state in self.hosts.items()}
+
+host_limiter = HostLimiter()
+
+#Shared HTTP session for article pages: keep-alive connections are pooled per host
+PAGE_FETCH_WORKERS = 16  # Max number of article pages downloaded at the same time
+PAGE_FETCH_TIMEOUT = (5, 15)  # (connect, read) timeout in seconds for a single page
+PAGE_FETCH_TIMEOUT_ASYNC = aiohttp.ClientTimeout(total=60, sock_connect=PAGE_FETCH_TIMEOUT[0], sock_read=PAGE_FETCH_TIMEOUT[1])  # Same limits for aiohttp, total bounds the host slot
+page_session = requests.Session()
+page_adapter = requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=PAGE_FETCH_WORKERS)
+page_session.mount('http://', page_adapter)
+page_session.mount('https://', page_adapter)
+page_fetch_executor = ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS, thread_name_prefix='page-fetch')
+
+#On-disk store of downloaded article pages shared by feed refresh, the agency/category routes and /summarize
+#Each normalized URL has a small JSON index file pointing to a zlib compressed body named by the sha256 of its content,
+#so identical pages are stored once and an index entry can be replaced atomically
+PAGE_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'page_cache')  # Kept out of cache_dir, which Flask-Caching owns
+PAGE_STORE_FRESH = timedelta(minutes=60)  # A stored page is served without downloading it again for this long
+PAGE_STORE_MAX_AGE = timedelta(days=1)  # Stored pages older than this are deleted by prune_page_store
+
+class PageStore:
+    def __init__(self, directory):
+        self.index_dir = os.path.join(directory, 'index')
+        self.body_dir = os.path.join(directory, 'bodies')
+        self.fields_dir = os.path.join(directory, 'fields')
+        os.makedirs(self.index_dir, exist_ok=True)
+        os.makedirs(self.body_dir, exist_ok=True)
+        os.makedirs(self.fields_dir, exist_ok=True)
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    def index_path(self, url):
+        return os.path.join(self.index_dir, hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest() + '.json')
+
+    def fields_path(self, url):
+        return os.path.join(self.fields_dir, hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest() + '.json')
+
+    # Fields extracted from a page by cache_page_fields, None when missing or older than PAGE_STORE_FRESH
+    def get_fields(self, url):
+        try:
+            with open(self.fields_path(url)) as f:
+                stored = json.load(f)
+            if time.time() - stored['extracted_at'] > PAGE_STORE_FRESH.total_seconds():
+                return None
+            return stored['fields']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put_fields(self, url, fields):
+        self.write(self.fields_path(url), json.dumps({'extracted_at': time.time(), 'fields': fields}).encode('utf-8'))
+
+    # One lock per URL, so pages requested by several threads at once are only downloaded once
+    # The lock is dropped when its last user releases it, self.locks only holds the URLs being downloaded
+    @contextlib.contextmanager
+    def lock(self, url):
+        key = normalize_url(url)
+        with self.locks_lock:
+            lock, users = self.locks.get(key, (None, 0))
+            lock = lock or threading.Lock()
+            self.locks[key] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self.locks_lock:
+                lock, users = self.locks[key]
+                if users == 1:
+                    del self.locks[key]
+                else:
+                    self.locks[key] = (lock, users - 1)
+
+    # Returns the stored page as text, or None when it is missing or older than PAGE_STORE_FRESH
+    # Pages stored by fetch_page_head only hold the <head>, they are only returned when `head` is set
+    def get(self, url, encoding=None, head=False):
+        try:
+            with open(self.index_path(url)) as f:
+                meta = json.load(f)
+            if time.time() - meta['fetched_at'] > PAGE_STORE_FRESH.total_seconds():
+                return None
+            if meta.get('head_only') and not head:
+                return None
+            with open(os.path.join(self.body_dir, meta['digest']), 'rb') as f:
+                body = zlib.decompress(f.read())
+        except (OSError, ValueError, KeyError, zlib.error):
+            return None
+        return body.decode(encoding or meta.get('encoding') or 'utf-8', errors='replace')
+
+    # Stores the raw bytes of a page with the encoding it was decoded with
+    def put(self, url, body, encoding, head_only=False):
+        digest = hashlib.sha256(body).hexdigest()
+        body_path = os.path.join(self.body_dir, digest)
+        if not os.path.exists(body_path):
+            self.write(body_path, zlib.compress(body))
+        meta = {'url': url, 'digest': digest, 'encoding': encoding, 'fetched_at': time.time(), 'head_only': head_only}
+        self.write(self.index_path(url), json.dumps(meta).encode('utf-8'))
+
+    # Forgets a page, its body is deleted by the next prune
+    def delete(self, url):
+        for path in (self.index_path(url), self.fields_path(url)):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+    # Writes to a temporary file first, readers never see a partial file
+    def write(self, path, data):
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    # Deletes index entries older than PAGE_STORE_MAX_AGE and the bodies no index entry points to anymore
+    def prune(self):
+        now = time.time()
+        referenced = set()
+        removed = 0
+        for name in os.listdir(self.index_dir):
+            path = os.path.join(self.index_dir, name)
+            try:
+                with open(path) as f:
+                    meta = json.load(f)
+                if now - meta['fetched_at'] > PAGE_STORE_MAX_AGE.total_seconds():
+                    os.remove(path)
+                    removed += 1
+                else:
+                    referenced.add(meta['digest'])
+            except (OSError, ValueError, KeyError):
+                continue
+        for name in os.listdir(self.body_dir):
+            path = os.path.join(self.body_dir, name)
+            # Skip files written in the last minute, their index entry may not be written yet
+            if name not in referenced and now - os.path.getmtime(path) > 60:
+                os.remove(path)
+        for name in os.listdir(self.fields_dir):
+            path = os.path.join(self.fields_dir, name)
+            with contextlib.suppress(FileNotFoundError):
+                if now - os.path.getmtime(path) > PAGE_STORE_MAX_AGE.total_seconds():
+                    os.remove(path)
+        return removed
+
+page_store = PageStore(PAGE_STORE_DIR)
+
+#Used to set job scheduler to remove old pages from the page store
+def prune_page_store():
+    removed = page_store.prune()
+    print(f"Removed {removed} pages from the page store")
+
+#Returns the HTML of an article page from the page store, downloading it through the shared session when it is not fresh
+def fetch_page(url, headers=None, encoding=None):
+    page = page_store.get(url, encoding)
+    if page is not None:
+        return page
+    with page_store.lock(url):
+        page = page_store.get(url, encoding)  # Another thread may have downloaded it while we waited
+        if page is not None:
+            return page
+        with host_limiter.slot(url) as slot:
+            response = page_session.get(url, headers=headers, timeout=PAGE_FETCH_TIMEOUT)
+            slot.done(response.status_code, response.headers.get('Retry-After'))
+        if encoding:
+            response.encoding = encoding
+        elif response.encoding is None:
+            response.encoding = response.apparent_encoding
+        if response.ok:  # Error pages (403, 429...) are not stored
+            page_store.put(url, response.content, response.encoding)
+        return response.text
+
+#Thumbnails only need the <head> of a page (og:image, ld+json, <link rel=preload>), so the response is streamed
+#and the connection closed as soon as it has been read
+PAGE_HEAD_CHUNK = 8192  # Bytes read from the response at a time
+PAGE_HEAD_MAX_BYTES = 512 * 1024  # Reading stops here even when the end of the head was not found
+
+LD_JSON_BLOCK = re.compile(rb'<script[^>]*application/ld\+json[^>]*>(.*?)</script>', re.IGNORECASE | re.DOTALL)
+
+#True once `data` holds the whole <head> of a page and, when `ld_json_paths` is given, an ld+json block that
+#resolves one of these paths (some sites put an Organization block in the head and their NewsArticle in the body)
+def page_head_complete(data, ld_json_paths=()):
+    if b'</head>' not in data.lower():
+        return False
+    if not ld_json_paths:
+        return True
+    blocks = []
+    for block in LD_JSON_BLOCK.findall(data):
+        try:
+            blocks.append(json.loads(block))
+        except ValueError:
+            continue
+    return any(ld_json_value(blocks, path) for path in ld_json_paths)
+
+#Returns the beginning of an article page up to the end of its <head>, from the page store when it holds the page
+def fetch_page_head(url, headers=None, ld_json_paths=(), encoding=None):
+    page = page_store.get(url, encoding, head=True)
+    if page is not None:
+        return page
+    with page_store.lock(url):
+        page = page_store.get(url, encoding, head=True)  # Another thread may have downloaded it while we waited
+        if page is not None:
+            return page
+        data = b''
+        with host_limiter.slot(url) as slot, page_session.get(url, headers=headers, timeout=PAGE_FETCH_TIMEOUT, stream=True) as response:
+            slot.done(response.status_code, response.headers.get('Retry-After'))
+            for chunk in response.iter_content(PAGE_HEAD_CHUNK):
+                data += chunk
+                if page_head_complete(data, ld_json_paths) or len(data) >= PAGE_HEAD_MAX_BYTES:
+                    break
+            encoding = encoding or response.encoding or 'utf-8'
+            if response.ok:
+                page_store.put(url, data, encoding, head_only=True)
+        return data.decode(encoding, errors='replace')
+
+#Cache keys for the stored copy of each RSS feed and for the feed version the cached entries were built from
+FEED_STORE_PREFIX = 'feed_store:'
+FEED_BUILT_FROM_PREFIX = 'feed_built_from:'
+#Entry fields the routes read, the stored copy of a feed keeps only these instead of the whole feedparser entry
+FEED_STORE_FIELDS = ('link', 'title', 'summary', 'summary_detail', 'published', 'published_parsed', 'updated',
+                     'media_content', 'media_thumbnail', 'links', 'img', 'field_article_billboard_image',
+                     'path', 'field_body', 'created', 'dc_date')
+
+#Downloads an RSS feed with a conditional GET (ETag / Last-Modified)
+#Returns the feed and its version; when the server answers 304 the stored copy of the feed is returned
+def fetch_feed(url):
+    stored = cache.get(FEED_STORE_PREFIX + url)
+    try:
+        with host_limiter.slot(url) as slot:
+            if stored is not None:
+                feed = feedparser.parse(url, etag=stored['etag'], modified=stored['modified'])
+            else:
+                feed = feedparser.parse(url)
+            slot.done(feed.get('status'), feed.get('headers', {}).get('retry-after'))
+    except HostBackoff as e:
+        # Serve the stored copy of the feed, if any, while its host is backed off
+        logging.warning(f"Not fetching {url}: {e}")
+        return stored_feed(stored), None
+    if stored is not None and feed.get('status') == 304:
+        return stored_feed(stored), (stored['etag'], stored['modified'])
+    return store_feed(url, feed, feed.get('etag'), feed.get('modified'))
+
+#Stores a downloaded feed with its validators for the next conditional GET, returns the feed and its version
+#Only the FEED_STORE_FIELDS of each entry are kept, the raw feedparser entries are never stored
+def store_feed(url, feed, etag, modified):
+    if not etag and not modified:
+        return feed, None  # The server does not support conditional requests
+    entries = [{key: entry[key] for key in FEED_STORE_FIELDS if key in entry} for entry in feed.entries]
+    cache.set(FEED_STORE_PREFIX + url, {'etag': etag, 'modified': modified, 'entries': entries}, timeout=0)
+    return feed, (etag, modified)
+
+#Rebuilds a feed from its stored copy, so the routes can read the entries like freshly parsed ones
+#(nested values such as entry.links[1].href or entry.summary_detail.value included)
+def stored_feed(stored):
+    entries = stored['entries'] if stored is not None else []
+    return feedparser.FeedParserDict(entries=[feed_dict(entry) for entry in entries])
+
+def feed_dict(value):
+    if isinstance(value, dict):
+        return feedparser.FeedParserDict({key: feed_dict(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [feed_dict(item) for item in value]
+    return value
+
+#Feeds and article pages are parsed on a dedicated pool, so neither the event loop nor the default executor is held by BeautifulSoup
+PARSE_WORKERS = 4  # Max number of feeds or pages parsed at the same time
+FEED_FETCH_TIMEOUT = aiohttp.ClientTimeout(total=60)
+parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix='parse')
+
+#Async version of fetch_feed for the refresh pipeline: the conditional GET goes through aiohttp and
+#feedparser only parses the downloaded bytes in parse_executor
+#`version` is the (etag, modified) the cached FeedEntry records were built from, nothing else is stored:
+#on a 304 it returns no feed, the caller keeps its cached entries
+async def fetch_feed_async(session, url, version=None):
+    loop = asyncio.get_running_loop()
+    headers = {}
+    if version is not None:
+        etag, modified = version
+        if etag:
+            headers['If-None-Match'] = etag
+        if modified:
+            headers['If-Modified-Since'] = modified
+    async with host_limiter.async_slot(url) as slot, session.get(url, headers=headers, timeout=FEED_FETCH_TIMEOUT) as response:
+        slot.done(response.status, response.headers.get('Retry-After'))
+        if response.status == 304 and version is not None:
+            return None, version
+        body = await response.read()
+        response_headers = {key.lower(): value for key, value in response.headers.items()}
+    feed = await loop.run_in_executor(parse_executor, functools.partial(feedparser.parse, body, response_headers=response_headers))
+    etag, modified = response_headers.get('etag'), response_headers.get('last-modified')
+    return feed, (etag, modified) if etag or modified else None
+
+#Logs when the event loop is blocked: sleeps for `interval` seconds and measures how late it wakes up
+#The largest lag seen is kept in stats['max'], check-ingest-blocking passes its own stats so the lag of the
+#refresh daemon running in the same process is not counted
+LOOP_LAG_THRESHOLD = 0.25  # Seconds the loop may be late before a warning is logged
+loop_lag = {'max': 0.0, 'warnings': 0}
+
+async def watch_loop_lag(interval=0.05, stats=loop_lag):
+    while True:
+        start = time.monotonic()
+        try:
+            await asyncio.sleep(interval)
+        finally:
+            # Also measured when cancelled, so a block right before the watched coroutine ends is not missed
+            lag = time.monotonic() - start - interval
+            stats['max'] = max(stats['max'], lag)
+            if lag > LOOP_LAG_THRESHOLD:
+                stats['warnings'] += 1
+                logging.warning(f"Event loop was blocked for {lag:.3f}s")
+
+#Fingerprint of the fields a feed entry is scraped from, to tell whether the previous scrape of its link can be reused
+def entry_fingerprint(entry):
+    source = '\n'.join(str(entry.get(key, '')) for key in ('link', 'title', 'summary', 'published', 'updated'))
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+#Makes an asynchronous GET request to specified URLs, reading through the page store
 async def fetch(session, url):
-        async with session.get(url, timeout=1000) as response:
-            return await response.text()
-        
+        loop = asyncio.get_running_loop()
+        page = await loop.run_in_executor(parse_executor, page_store.get, url)
+        if page is not None:
+            return page
+        async with host_limiter.async_slot(url) as slot, session.get(url, timeout=PAGE_FETCH_TIMEOUT_ASYNC) as response:
+            slot.done(response.status, response.headers.get('Retry-After'))
+            body = await response.read()
+            encoding = response.get_encoding()
+            if response.status < 400:
+                await loop.run_in_executor(parse_executor, page_store.put, url, body, encoding)
+            return body.decode(encoding, errors='replace')
+
+#Async version of fetch_page_head
+async def fetch_head(session, url, ld_json_paths=(), encoding=None):
+        loop = asyncio.get_running_loop()
+        page = await loop.run_in_executor(parse_executor, functools.partial(page_store.get, url, encoding, head=True))
+        if page is not None:
+            return page
+        async with host_limiter.async_slot(url) as slot, session.get(url, timeout=PAGE_FETCH_TIMEOUT_ASYNC) as response:
+            slot.done(response.status, response.headers.get('Retry-After'))
+            data = b''
+            async for chunk in response.content.iter_chunked(PAGE_HEAD_CHUNK):
+                data += chunk
+                if page_head_complete(data, ld_json_paths) or len(data) >= PAGE_HEAD_MAX_BYTES:
+                    break
+            response.close()  # Drop the connection instead of reading the rest of the body
+            encoding = encoding or response.charset or 'utf-8'
+            if response.status < 400:
+                await loop.run_in_executor(parse_executor, functools.partial(page_store.put, url, data, encoding, head_only=True))
+            return data.decode(encoding, errors='replace')
+
 #Define various parsing logic for specified URLs
-async def parse_feed(session, url):
-            loop = asyncio.get_event_loop()
-            feed = await loop.run_in_executor(None, feedparser.parse, url)
+async def parse_feed(session, url, feed=None, previous=None):
+            loop = asyncio.get_running_loop()
+            if feed is None:
+                feed, _ = await fetch_feed_async(session, url)
             entries = []
+            # Entries of the previous refresh by link, their scraped images and summaries are reused when unchanged
+            previous_by_link = {entry.get('link'): entry for entry in previous or [] if entry.get('source_fingerprint')}
+            reused = 0
 
             if 'bbci.co.uk' in url:
                 feed.entries = feed.entries[:12]  # Change 12 to the number of entries you want
@@ -88,84 +808,24 @@ async def parse_feed(session, url):
                     twenty_four_hours_ago = current_time - timedelta(hours=24)
                     if published_time < twenty_four_hours_ago:
                         continue  # Skip this entry if it's older than 24 hours
+                fingerprint = entry_fingerprint(entry)
+                previous_entry = previous_by_link.get(entry.get('link'))
+                if previous_entry is not None and previous_entry['source_fingerprint'] == fingerprint:
+                    entries.append(FeedEntry.from_entry(previous_entry))  # Older caches hold feedparser entries
+                    reused += 1
+                    continue
                 try:
-                    page_html = await fetch(session, entry.link)
-                    soup = BeautifulSoup(page_html, 'html.parser')
-                    if 'nhk.or.jp' in url:
-                        script_tags = soup.find_all('script', type='application/ld+json')
-                        for script_tag in script_tags:
-                            data = json.loads(script_tag.string)
-                            if data.get('@type') == 'NewsArticle' and 'image' in data and len(data['image']) > 0:
-                                entry['image_url'] = data['image'][0]['url']
-                                break
-                
-                    elif 'aljazeera.com' in url:
-                        script_tag = soup.find('script', type='application/ld+json')
-                        if script_tag is not None:
-                            data = json.loads(script_tag.string)
-                            if 'image' in data and isinstance(data['image'], list) and 'url' in data['image'][0]:
-                                entry['image_url'] = data['image'][0]['url']
-                            else:
-                                entry['image_url'] = 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQ9sXvoSpXCYsdA1qW74Q3uGp8CAN19bUWGoQ&s'
-                        else:
-                            entry['image_url'] = 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQ9sXvoSpXCYsdA1qW74Q3uGp8CAN19bUWGoQ&s'
-
-                    elif 'bbci.co.uk' in url:
-                        if 'media_thumbnail' in entry and len(entry['media_thumbnail']) > 0:
-                            entry['image_url'] = entry['media_thumbnail'][0]['url']
-                        else:
-                            entry['image_url'] = 'https://upload.wikimedia.org/wikipedia/commons/thumb/e/ea/BBC_World_News_2022_%28Boxed%29.svg/800px-BBC_World_News_2022_%28Boxed%29.svg.png'
-                        p_tag = soup.find('p', class_='sc-eb7bd5f6-0 fYAfXe')
-                        if p_tag is not None:
-                            lines = p_tag.get_text(separator='\n').split('\n')
-                            entry['summary'] = '\n'.join(lines[:3]) + '...'
-
-                    elif 'theguardian.com' in url:
-                        if 'media_content' in entry and len(entry['media_content']) > 0:
-                            entry['image_url'] = entry['media_content'][0]['url']
-                        else:
-                            entry['image_url'] = 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQR_E1vW-vT3q3rKzhtxt6MHMezjtmOp3_5dg&s'
-                        soup = BeautifulSoup(entry['summary'], 'html.parser') 
-                        for div in soup.find_all("div", {'class':' dcr-4gwv1z'}):
-                            div.decompose() 
-                        summary_text = soup.get_text()
-                        summary_words = summary_text.split()  # Split the text by spaces to get a list of words
-                        max_words = 40  # Set your desired maximum number of words
-                        entry['summary'] = ' '.join(summary_words[:max_words]) + ',continued ... '
-
-                    elif 'cbsnews.com' in url:
-                        response = requests.get(entry.link)
-                        soup = BeautifulSoup(response.text, 'html.parser')
-                        image_tag = soup.find('link', {'rel': 'preload', 'as': 'image'})
-                        if image_tag:
-                            entry['image_url'] = image_tag['href']
-                        else:
-                            entry['image_url'] = 'https://e7.pngegg.com/pngimages/901/52/png-clipart-cbs-corporation-logo-united-states-of-america-television-betting-television-text.png'
-                        if 'summary' in entry:
-                            soup = BeautifulSoup(entry['summary'], 'html.parser')
-                            summary_text = soup.get_text()
-                            summary_lines = summary_text.split('\n')  # Split the text by newline characters
-                            entry['summary'] = '\n'.join(summary_lines[:1]) 
-
-                    elif 'cnbc.com' in url:
-                        response = requests.get(entry.link)
-                        soup = BeautifulSoup(response.text, 'html.parser')
-                        script_tag = soup.find('script', type='application/ld+json')
-                        if script_tag:
-                            data = json.loads(script_tag.string)
-                            entry['image_url'] = data.get('image', {}).get('url', 'https://upload.wikimedia.org/wikipedia/commons/4/4c/CNBC_logo.svg')
-                        else:
-                            entry['image_url'] = 'https://sc.cnbcfm.com/applications/cnbc.com/staticcontent/img/cnbc_logo.gif'
-                    if 'summary' in entry:
-                        entry['summary'] = html.unescape(entry['summary'])
-                    entries.append(entry)
+                    fields = EMPTY_PAGE_FIELDS
+                    if needs_page(entry.link):
+                        fields = await page_fields_async(session, entry.link)
+                    await loop.run_in_executor(parse_executor, enrich_entry, entry, fields)
+                    entry['source_fingerprint'] = fingerprint  # Only set after a successful scrape, failed ones are retried
                     
                 except Exception as e:
                     print(f"An error occurred: {e}")
                     entry['image_url'] = 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQ9w-00zDGFh6VtxNsOtRMeflVFF6GQunbMrA&s'
-                    entries.append(entry) # Add this line here
 
-                publish_date = entry.get('published')
+                publish_date = entry.get('published') or fields['date']  # The page date when the feed has none
                 if publish_date:
                     try:
                         if isinstance(publish_date, str):
@@ -178,33 +838,256 @@ async def parse_feed(session, url):
                     except ValueError:
                         publish_date = None
                 entry['publish_date'] = publish_date    
+                entries.append(FeedEntry.from_entry(entry))  # Only the fields the templates use are cached
+            if reused:
+                print(f"{url}: reused {reused} unchanged entries, scraped {len(entries) - reused}")
             entries = sorted(entries, key=lambda e: (e['publish_date'] is None, e['publish_date']), reverse=True)
             return entries #Display the entries in descending order of published date
 
 #Fetches and parses a web feed from a given URL and store it in the cache
-async def fetch_and_parse(url):
+#Runs on the session of refresh_daemon, a session is only created for one-off calls
+async def fetch_and_parse(url, session=None):
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await fetch_and_parse(url, session)
     print(f"Fetching and parsing {url}")  
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    async with aiohttp.ClientSession() as session:
-        for _ in range(3):  # Retry up to 3 times
-            try:
-                entries = await parse_feed(session, url)
-                cache.set(url, entries)
-                print(f"Cache set for {url} with {len(entries)} entries")
+    loop = asyncio.get_running_loop()
+    for _ in range(3):  # Retry up to 3 times
+        try:
+            built_from, previous = await loop.run_in_executor(parse_executor, cached_feed_state, url)
+            # The conditional GET uses the version the cached entries were built from, so a 304 means they are current
+            feed, version = await fetch_feed_async(session, url, tuple(built_from) if built_from and previous is not None else None)
+            # Skip the whole entry/page pipeline when the feed is unchanged since the cached entries were built
+            if feed is None or (version is not None and version == tuple(built_from or ()) and previous is not None):
+                print(f"{url} has not been modified, keeping the cached entries")
+                await loop.run_in_executor(parse_executor, mark_feed_refreshed, url)
                 break
-            except IncompleteRead:
-                print(f"IncompleteRead error when fetching {url}, retrying...")
-                continue
-
-#Used to set job scheduler to fetch and parse the URLs every 60 minutes
-def sync_fetch_and_parse(url):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+            entries = await parse_feed(session, url, feed, previous=previous)
+            await loop.run_in_executor(parse_executor, store_feed_entries, url, entries, version)
+            break
+        except HostBackoff as e:
+            print(f"Not refreshing {url}: {e}")
+            break
+        except (IncompleteRead, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"{type(e).__name__} error when fetching {url}, retrying...")
+            continue
+
+#Returns the feed version the cached entries of a feed were built from and the entries themselves
+def cached_feed_state(url):
+    return cache.get(FEED_BUILT_FROM_PREFIX + url), cache.get(url)
+
+#Caches the parsed entries of a feed and rebuilds the home timeline
+def store_feed_entries(url, entries, version):
+    cache.set(url, entries, timeout=0)
+    cache.set(FEED_BUILT_FROM_PREFIX + url, version, timeout=0)
+    print(f"Cache set for {url} with {len(entries)} entries")
+    build_home_timeline()
+    mark_feed_refreshed(url)
+
+FEED_REFRESHED_PREFIX = 'feed_refreshed:'  # Time of the last successful refresh of each feed, for /readyz
+
+def mark_feed_refreshed(url):
+    cache.set(FEED_REFRESHED_PREFIX + url, time.time(), timeout=0)
+
+#Runs a coroutine while watch_loop_lag checks that it never blocks the event loop
+async def watched(coro, stats=loop_lag):
+    watchdog = asyncio.create_task(watch_loop_lag(stats=stats))
+    await asyncio.sleep(0)  # Let the watchdog start before the coroutine can block
     try:
-        loop.run_until_complete(fetch_and_parse(url))
+        return await coro
     finally:
-        loop.close()
+        watchdog.cancel()
+        await asyncio.gather(watchdog, return_exceptions=True)
+
+HOME_TIMELINE_KEY = 'home_timeline'  # Merged and sorted entries of every feed, as rendered by home()
+home_timeline_lock = threading.Lock()
+
+#Merges the cached entries of every feed into the home page timeline, newest first, and stores it as one cache object
+#unless `store` is False (home() before the first refresh, so an empty timeline is never kept)
+def build_home_timeline(store=True):
+    with home_timeline_lock:
+        entries = []
+        for url in URLS:
+            feed_entries = cache.get(url)
+            if feed_entries is not None:
+                for entry in feed_entries:
+                    if entry['publish_date'] is not None and not isinstance(entry['publish_date'], datetime):
+                        try:
+                            entry['publish_date'] = parse(str(entry['publish_date']))
+                        except (ValueError, ParserError):
+                            entry['publish_date'] = None
+                # Caches written before FeedEntry hold feedparser entries until their feed changes
+                entries.extend(entry if isinstance(entry, FeedEntry) else FeedEntry.from_entry(entry) for entry in feed_entries)
+        far_future = datetime.now() + timedelta(days=100*365) #Give articles without a publish date a far future date
+        entries.sort(key=lambda e: e['publish_date'] if e['publish_date'] is not None else far_future, reverse=True)
+        if store:
+            cache.set(HOME_TIMELINE_KEY, entries, timeout=0)
+            print(f"Home timeline rebuilt with {len(entries)} entries")
+        return entries
+
+#Feeds are refreshed by one background thread running a single event loop and aiohttp session for the life of
+#the process, so connection pools and DNS lookups are reused between refreshes
+REFRESH_INTERVAL = 60 * 60  # Seconds between two refreshes of a feed
+REFRESH_JITTER = 5 * 60  # Each wait is randomly up to this many seconds shorter or longer, so feeds do not refresh together
+REFRESH_CONNECTIONS = 32  # Max open connections of the refresh session
+REFRESH_DNS_TTL = 10 * 60  # Seconds DNS results are cached by the refresh session
+
+class RefreshDaemon:
+    def __init__(self, urls):
+        self.urls = urls
+        self.thread = None  # Only set in the leader
+        self.loop = None
+        self.session = None
+        self.running = {}  # url -> task of the refresh in progress
+        self.election = None
+        self.started = threading.Event()
+        self.watchdog = None  # Task of watch_loop_lag, kept so it is not garbage collected and can be cancelled
+
+    # `election` is the LeaderElection of this process, scheduled refreshes are skipped while it is not the leader
+    def start(self, election=None):
+        self.election = election
+        self.thread = threading.Thread(target=self.run, name='feed-refresh', daemon=True)
+        self.thread.start()
+        self.started.wait()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.main())
+
+    async def main(self):
+        connector = aiohttp.TCPConnector(limit=REFRESH_CONNECTIONS, ttl_dns_cache=REFRESH_DNS_TTL)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            self.session = session
+            self.started.set()
+            self.watchdog = asyncio.create_task(watch_loop_lag())  # Logs whenever the refresh pipeline blocks the loop
+            try:
+                await asyncio.gather(*(self.schedule(url) for url in self.urls))
+            finally:
+                self.watchdog.cancel()
+                await asyncio.gather(self.watchdog, return_exceptions=True)
+
+    # Refreshes one feed every REFRESH_INTERVAL, give or take REFRESH_JITTER
+    async def schedule(self, url):
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL + random.uniform(-REFRESH_JITTER, REFRESH_JITTER))
+            if self.election is None or self.election.is_leader:  # A Redis lease can be lost, see RedisLeaderElection
+                await self.refresh(url)
+
+    # Refreshes a feed; asking while a refresh of the same feed is running waits for that one instead of starting another
+    async def refresh(self, url):
+        task = self.running.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self.run_refresh(url))
+            self.running[url] = task
+        await asyncio.shield(task)
+
+    async def run_refresh(self, url):
+        try:
+            await fetch_and_parse(url, self.session)
+        except Exception:
+            logging.exception(f"Refreshing {url} failed")
+        finally:
+            self.running.pop(url, None)
+
+    # Refreshes every feed now, can be called from any thread; returns a concurrent.futures.Future
+    def refresh_all(self):
+        async def refresh_urls():
+            await asyncio.gather(*(self.refresh(url) for url in self.urls))
+        return asyncio.run_coroutine_threadsafe(refresh_urls(), self.loop)
+
+refresh_daemon = RefreshDaemon(URLS)
+
+#With several workers (gunicorn, uvicorn...) only the process holding LEADER_LOCK refreshes the feeds, the others
+#serve what it writes to the shared cache. The OS releases the lock when the leader dies, and the first worker to
+#take it within LEADER_RETRY seconds becomes the new leader
+LEADER_LOCK = os.path.join(lock_dir, 'refresh.lock')
+LEADER_RETRY = 30  # Seconds between two attempts of a worker to become the leader
+
+class LeaderElection:
+    def __init__(self, path, on_elected):
+        self.lock = FileLock(path, thread_local=False)
+        self.on_elected = on_elected
+        self.is_leader = False
+
+    def try_acquire(self):
+        try:
+            self.lock.acquire(timeout=0)
+        except FileLockTimeout:
+            return False
+        self.is_leader = True
+        logging.info(f"Process {os.getpid()} is now the feed refresh leader")
+        return True
+
+    # Returns True when this process is elected at once (on_elected is left to the caller),
+    # otherwise keeps trying in the background and calls on_elected once elected
+    def start(self):
+        if self.try_acquire():
+            return True
+        threading.Thread(target=self.wait_for_leadership, name='leader-election', daemon=True).start()
+        return False
+
+    def wait_for_leadership(self):
+        while not self.try_acquire():
+            time.sleep(LEADER_RETRY)
+        self.on_elected()
+
+#With CACHE_REDIS_URL every node shares the cache, so the leader is elected through Redis instead of a local file:
+#the leader holds LEADER_KEY with a lease of LEADER_LEASE seconds (SET NX PX) and renews it every third of the lease.
+#When the leader dies the lease expires and another worker of any node takes it within LEADER_RETRY seconds.
+#A leader that could not renew its lease stops refreshing until it gets the lease back
+LEADER_KEY = 'bywym:refresh_leader'
+LEADER_LEASE = 30
+RENEW_LEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+RELEASE_LEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+class RedisLeaderElection(LeaderElection):
+    def __init__(self, client, key, on_elected):
+        self.client = client
+        self.key = key
+        self.token = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}'  # Only the holder renews or releases the lease
+        self.on_elected = on_elected
+        self.is_leader = False
+        self.renewed_at = None
+        self.renewing = False
+
+    def try_acquire(self):
+        try:
+            acquired = self.client.set(self.key, self.token, nx=True, px=LEADER_LEASE * 1000)
+        except redis.exceptions.RedisError as e:
+            logging.warning(f"Could not take the refresh lease: {e}")
+            return False
+        if not acquired:
+            return False
+        self.is_leader = True
+        self.renewed_at = time.monotonic()
+        logging.info(f"Process {os.getpid()} on {socket.gethostname()} is now the feed refresh leader")
+        if not self.renewing:
+            self.renewing = True
+            threading.Thread(target=self.keep_lease, name='leader-lease', daemon=True).start()
+            atexit.register(self.release)
+        return True
+
+    def keep_lease(self):
+        while True:
+            time.sleep(LEADER_LEASE / 3)
+            if not self.is_leader:
+                self.try_acquire()
+                continue
+            try:
+                if self.client.eval(RENEW_LEASE_SCRIPT, 1, self.key, self.token, LEADER_LEASE * 1000):
+                    self.renewed_at = time.monotonic()
+                    continue
+            except redis.exceptions.RedisError as e:
+                logging.warning(f"Could not renew the refresh lease: {e}")
+                if time.monotonic() - self.renewed_at < LEADER_LEASE:
+                    continue  # The lease may still be ours
+            self.is_leader = False
+            logging.error(f"Process {os.getpid()} lost the refresh lease, feed refreshes are paused")
+
+    def release(self):
+        with contextlib.suppress(redis.exceptions.RedisError):
+            self.client.eval(RELEASE_LEASE_SCRIPT, 1, self.key, self.token)
 
 #Fetches and parses multiple web feeds concurrently
 async def fetch_all(urls):
@@ -217,26 +1100,110 @@ async def fetch_all(urls):
 
 #Set Database
 db = SQLAlchemy()
+migrate = Migrate(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+
+#Normalized form of an article URL: same scheme for http/https, lowercase host, no fragment, trailing slash or utm_* parameters
+#(migrations/versions/b2d4f6a8c013 keeps a copy of this function, add a migration when changing it)
+def normalize_url(url):
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = 'https' if parts.scheme.lower() in ('http', 'https') else parts.scheme.lower()
+    query = urllib.parse.urlencode([(key, value) for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+                                    if not key.lower().startswith('utm_')])
+    return urllib.parse.urlunsplit((scheme, parts.netloc.lower(), parts.path.rstrip('/') or '/', query, ''))
 class Article(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     url = db.Column(db.String(500), nullable=False)  # URL of the article
+    url_key = db.Column(db.String(500), nullable=False, unique=True, index=True)  # normalize_url(url), one row per article
     published_date = db.Column(db.DateTime)  # Date the article was published
     comments = db.relationship('Comment', backref='article', lazy='dynamic') # One-to-many relationship with Comment
     
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.String(500), nullable=False)
-    article_id = db.Column(db.Integer, db.ForeignKey('article.id'))
+    article_id = db.Column(db.Integer, db.ForeignKey('article.id'), index=True)
+
+#AI summaries, cached per article URL and model
+class Summary(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String(500), nullable=False)  # URL of the summarized article
+    model_name = db.Column(db.String(20), nullable=False)  # 'english' or 'japanese'
+    content_hash = db.Column(db.String(64), nullable=False)  # sha256 of the extracted article text
+    summary = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)  # When the summary was generated
+    checked_at = db.Column(db.DateTime, nullable=False)  # When the article text was last compared with content_hash
+    last_used = db.Column(db.DateTime, nullable=False)  # Used to evict the least recently used summaries
+    __table_args__ = (db.UniqueConstraint('url', 'model_name'),)
+
+#Agency and category pages are cached stale-while-revalidate: a page older than PAGE_SOFT_TTL is still served at once
+#while a background rebuild replaces it, and it is only dropped after PAGE_HARD_TTL. The leader builds the missing
+#pages after the first feed refresh and every PAGE_WARM_INTERVAL, so visitors do not wait for the scrape
+PAGE_SOFT_TTL = 900  # Seconds before a page is rebuilt in the background
+PAGE_HARD_TTL = 24 * 3600  # Seconds before a page that was not rebuilt is dropped
+PAGE_REBUILD_TIMEOUT = 300  # A rebuild still running after this many seconds may be started again
+PAGE_REBUILD_WORKERS = 2
+PAGE_WARM_INTERVAL = 60  # Minutes between two runs of warm_pages in the leader
+RENDERED_PAGE_PREFIX = 'rendered_page:'
+PAGE_REBUILD_PREFIX = 'page_rebuild:'
+page_rebuild_executor = ThreadPoolExecutor(max_workers=PAGE_REBUILD_WORKERS, thread_name_prefix='page-rebuild')
+stale_while_revalidate_views = {}  # endpoint -> view function
+
+#Renders a page and caches it with the time it was built
+def render_page(endpoint):
+    page = stale_while_revalidate_views[endpoint]()
+    cache.set(RENDERED_PAGE_PREFIX + endpoint, {'page': page, 'built_at': time.time()}, timeout=PAGE_HARD_TTL)
+    return page
+
+def rebuild_page(endpoint):
+    try:
+        with app.test_request_context():  # The templates need url_for
+            render_page(endpoint)
+        print(f"Page {endpoint} rebuilt")
+    except Exception:
+        logging.exception(f"Rebuilding page {endpoint} failed")
+    finally:
+        cache.delete(PAGE_REBUILD_PREFIX + endpoint)
+
+#Starts a background rebuild unless one is already running, in this worker or another one
+def schedule_rebuild(endpoint):
+    if cache.add(PAGE_REBUILD_PREFIX + endpoint, os.getpid(), timeout=PAGE_REBUILD_TIMEOUT):
+        page_rebuild_executor.submit(rebuild_page, endpoint)
+
+def page_is_stale(cached):
+    return cached is None or time.time() - cached['built_at'] > PAGE_SOFT_TTL
+
+def stale_while_revalidate(view):
+    endpoint = view.__name__
+    stale_while_revalidate_views[endpoint] = view
+
+    @functools.wraps(view)
+    def wrapper():
+        cached = cache.get(RENDERED_PAGE_PREFIX + endpoint)
+        if cached is None:
+            return render_page(endpoint)  # Never built, or not rebuilt for PAGE_HARD_TTL
+        if page_is_stale(cached):
+            schedule_rebuild(endpoint)
+        return cached['page']
+    return wrapper
+
+#Run by the leader: rebuilds the pages that are missing or stale
+def warm_pages():
+    for endpoint in stale_while_revalidate_views:
+        if page_is_stale(cache.get(RENDERED_PAGE_PREFIX + endpoint)):
+            schedule_rebuild(endpoint)
 
 #Create the Flask app to enable Scheduler, cache and database
 def create_app():
     app = Flask(__name__)
     app.config['CACHE_TYPE'] = 'filesystem'
     cache.init_app(app)
+    if CACHE_REDIS_URL:
+        cache.cache.serializer = CompactSerializer()
 
+    # Jobs for this process only (the AI models are loaded per process) stay in memory,
+    # jobs for the whole app go to jobs.sqlite, which is only opened by the leader
     jobstores = {
-        'default': SQLAlchemyJobStore(url='sqlite:///jobs.sqlite')
+        'default': MemoryJobStore()
     }
 
     scheduler = BackgroundScheduler(jobstores=jobstores)
@@ -244,31 +1211,64 @@ def create_app():
 
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'  # Use your actual database URI
     db.init_app(app)
+    migrate.init_app(app, db)
 
-    # Import your models here
-    with app.app_context():
-        db.create_all()  # Create the database tables
+    # Create or upgrade the database tables, one process at a time
+    with app.app_context(), FileLock(os.path.join(lock_dir, 'migrate.lock')):
+        upgrade()
     
-    def initialize():
-        logging.info("Initializing.....")
+    # Runs in the leader only: refreshes the feeds and runs the jobs for the whole app
+    def lead():
+        scheduler.add_jobstore(SQLAlchemyJobStore(url='sqlite:///jobs.sqlite'), 'shared')
+        # Older versions kept one refresh job per URL and the per-process jobs in jobs.sqlite
+        for job in scheduler.get_jobs(jobstore='shared'):
+            if job.id not in ('prune_page_store', 'warm_pages'):
+                job.remove()
+        scheduler.add_job('app:prune_page_store', 'interval', minutes=60, id='prune_page_store', jobstore='shared', replace_existing=True)
+        scheduler.add_job('app:warm_pages', 'interval', minutes=PAGE_WARM_INTERVAL, id='warm_pages', jobstore='shared', replace_existing=True)
+        refresh_daemon.start(leader_election)
+        # Warm up in the background, the routes serve what the cache directory already holds meanwhile
+        refresh_daemon.refresh_all().add_done_callback(functools.partial(warm_up_done, time.time()))
+        print(f"Refreshing {len(URLS)} feeds every {REFRESH_INTERVAL // 60} minutes")
+
+    def warm_up_done(started_at, future):
         global cache_ready
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        tasks = [fetch_and_parse(url) for url in URLS]
-        loop.run_until_complete(asyncio.gather(*tasks))
-        for url in URLS:
-            scheduler.add_job('app:sync_fetch_and_parse', 'interval', minutes=60, args=(url,))
-            print(f"Added job to fetch and parse {url} every 60 minutes")
+        page_rebuild_executor.submit(warm_pages)  # Build the agency and category pages, they use their own feeds
+        refreshed = sum((cache.get(FEED_REFRESHED_PREFIX + url) or 0) >= started_at for url in URLS)
+        if not refreshed:
+            logging.warning("The first refresh did not refresh any feed, the cache is not ready")
+            return
         cache_ready = True
+        print(f"{refreshed} of {len(URLS)} feeds refreshed, the cache is ready")
+
+    def initialize():
+        logging.info("Initializing.....")
+        scheduler.add_job('app:unload_idle_models', 'interval', minutes=10, id='unload_idle_models', replace_existing=True)
+        scheduler.start()
+        print("Scheduler started...")
+        if leader_election.start():
+            lead()
+        else:
+            print("Another process refreshes the feeds, serving them from the shared cache")
 
+    if CACHE_REDIS_URL:
+        leader_election = RedisLeaderElection(redis.from_url(CACHE_REDIS_URL), LEADER_KEY, lead)
+    else:
+        leader_election = LeaderElection(LEADER_LOCK, lead)
     initialize()
-    scheduler.start()
-    print("Scheduler started...")
+    if MODEL_PREWARM:
+        model_registry.prewarm()
     return app
 
 app = create_app()
 print("Flask app created successfully...")
 
+#Comment threads are cached per article: the version of a thread is the id of its newest comment,
+#so a new comment makes every cached page of the thread unreachable and changes its ETag
+COMMENTS_CACHE_TIMEOUT = 3600
+COMMENTS_VERSION_PREFIX = 'comments_version:'
+COMMENTS_PAGE_PREFIX = 'comments_page:'
+
 #Post comments
 @app.route('/comments', methods=['POST'])
 def post_comment():
@@ -282,247 +1282,474 @@ def post_comment():
         comment = Comment(content=content, article_id=article.id)
         db.session.add(comment)
         db.session.commit()
+        # Write-through: move the thread to its new version (never back to an older one)
+        version_key = COMMENTS_VERSION_PREFIX + str(article.id)
+        if (cache.get(version_key) or 0) < comment.id:
+            cache.set(version_key, comment.id, timeout=COMMENTS_CACHE_TIMEOUT)
         return '', 200
     else:
         return 'Invalid input', 400
 
-#Get comments
+#Settings for comment pages
+COMMENTS_PAGE_SIZE = 20  # Comments returned when the client does not ask for a limit
+COMMENTS_MAX_PAGE_SIZE = 100  # Largest limit a client can ask for
+
+#Version of an article's comment thread (0 when it has no comments), None when the article does not exist
+def comments_version(article_id):
+    version = cache.get(COMMENTS_VERSION_PREFIX + str(article_id))
+    if version is None:
+        if Article.query.get(article_id) is None:
+            return None
+        version = db.session.query(db.func.max(Comment.id)).filter(Comment.article_id == article_id).scalar() or 0
+        cache.set(COMMENTS_VERSION_PREFIX + str(article_id), version, timeout=COMMENTS_CACHE_TIMEOUT)
+    return version
+
+#One page of comments, see get_comments()
+def comments_page(article_id, limit, after, before):
+    query = Comment.query.filter_by(article_id=article_id)
+    if after is not None:
+        comments = query.filter(Comment.id > after).order_by(Comment.id.asc()).limit(limit + 1).all()
+        has_more = len(comments) > limit
+        comments = comments[:limit]
+    else:
+        if before is not None:
+            query = query.filter(Comment.id < before)
+        comments = query.order_by(Comment.id.desc()).limit(limit + 1).all()
+        has_more = len(comments) > limit
+        comments = comments[:limit][::-1]
+    return dict(comments=[{'id': comment.id, 'content': comment.content} for comment in comments],
+                newest_id=comments[-1].id if comments else after,
+                oldest_id=comments[0].id if comments else before,
+                has_more=has_more)
+
+#Get comments, one page at a time (keyset pagination on Comment.id):
+#  no cursor      -> the newest comments
+#  ?after=<id>    -> comments newer than <id>, for clients polling for what they have not seen yet
+#  ?before=<id>   -> comments older than <id>, to load earlier comments
+#Comments are always returned oldest first; has_more tells if more comments exist in the paging direction.
+#Pages are served from the cache with an ETag, an unchanged thread is answered with 304 without touching the database
 @app.route('/articles/<int:article_id>/comments', methods=['GET'])
 def get_comments(article_id):
-    article = Article.query.get(article_id)
-    if article is None:
+    version = comments_version(article_id)
+    if version is None:
         return 'Article not found', 404
-    comments = [comment.content for comment in article.comments]
-    return jsonify(comments)
-
-# summay NHK
-def parse_nhk_article(url):
-    response = requests.get(url)
-    response.encoding = 'utf-8'
-    soup = BeautifulSoup(response.text, 'html.parser') 
-    # Find the summary and p text
-    summary = soup.find('p', {'class': 'content--summary'})
-    summary_text = summary.get_text(separator=' ') if summary else ''  
-    div_tags = soup.find_all('div', class_='body-text')
-    body_text_lines = []
-    for div in div_tags:
-        p_tag = div.find('p')
-        if p_tag is not None:
-            body_text_lines.append(p_tag.get_text(separator=' '))
-    # Join the body text lines together
-    body_text = ' '.join(body_text_lines)  
-    # Combine the summary and body text and return the result
-    return summary_text + ' ' + body_text
-# summay BBC
-def parse_bbc_article(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser') 
-    p_tags = soup.find_all('p', class_='sc-eb7bd5f6-0 fYAfXe')
-    lines = [p.get_text() for p in p_tags]
-    # Join the lines together and return the result
-    return ' '.join(lines)
-# summay Aljazeera
-def parse_aljazeera_article(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser') 
-    # Find the <div> with the specified class
-    div = soup.find('div', class_='wysiwyg wysiwyg--all-content css-ibbk12')
-    if div is None:
-        return None
-    p_tags = div.find_all('p')
-    lines = [p.get_text() for p in p_tags]
-    return ' '.join(lines)
-# summay CBS
-def parse_cbsnews_article(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser') 
-    # Find the <section> with the specified class
-    section = soup.find('section', class_='content__body')
-    if section is None:
-        return None
-    p_tags = section.find_all('p')
-    lines = [p.get_text() for p in p_tags]
-    return ' '.join(lines)
-# summay NTV
-def parse_ntv_article(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    p_tag = soup.find('p', {'class': 'player-text'})
-    if p_tag is None:
-        return None
-    text = p_tag.get_text()
-    return text
-# summay Guardian
-def parse_guardian_article(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # Find all <p> tags with the specified class
-    paragraphs = soup.find_all('p', class_=['dcr-iy9ec7', 'dcr-jdlpgv', 'dcr-shm5ll', 'dcr-ntq2eh'])
-    text = [p.get_text() for p in paragraphs]
-    return text        
-# summay UN
-def parse_un_article(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # Find the <div> tag with the specified class
-    div = soup.find('div', class_='clearfix text-formatted field field--name-field-text-column field--type-text-long field--label-hidden field__item')
-    paragraphs = div.find_all('p') if div else []
-    text = [p.get_text() for p in paragraphs]
-    return text
-# summay UN Sustainablity
-def parse_un_sustainablity_article(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # Find all <p> tags with the specified class
-    paragraphs = [p for p in soup.find_all('p', class_='story-body__introduction') if not p.find('span')]
-    # Extract the text from each paragraph
-    text = [p.get_text() for p in paragraphs]
-    return text
-# summay UNEP
-def parse_unep_article(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.97 Safari/537.36',
-    }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # Find all <div> tags with the specified class
-    divs = soup.find_all('div', class_='paragraph paragraph--type--content paragraph--view-mode--default')
-    # Find all <p> tags within each <div> tag and extract the text
-    text = [p.get_text() for div in divs for p in div.find_all('p')]
-    return text
-# summay Politico(Error 403)
-def parse_politico_article(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.97 Safari/537.36',
-    }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # Find all <p> tags with the specified class
-    paragraphs = soup.find_all('p', class_='story-text__paragraph  ')
-    # Extract the text from each paragraph
-    text = [p.get_text() for p in paragraphs]
-    return text
-# summay CNBC
-def parse_cnbc_article(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # Find all <div> tags with class 'group'
-    divs = soup.find_all('div', class_='group')
-    # For each div, find all <p> tags and extract the text
-    text = [p.get_text() for div in divs for p in div.find_all('p')]
-    return text
-# summay WebMD
-def parse_webmd_article(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.97 Safari/537.36',
-    }
-    response = requests.get(url, headers=headers)
-    print(f"Response status: {response.status_code}")
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # Find the div with the specified classes
-    article_body = soup.find('div', class_='article-body')
-    article_page = article_body.find('div', class_='article-page active-page') if article_body else None
-    # Find all <p> tags within the div
-    paragraphs = article_page.find_all('p') if article_page else []
-    # Extract the text from each paragraph
-    text = [p.get_text() for p in paragraphs]
-    return text
-# summay ENN
-def parse_enn_article(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # Find the section with the specified class and attribute
-    article_content = soup.find('section', class_='article-content', itemprop='articleBody')
-    # Find all <p> tags within the section
-    paragraphs = article_content.find_all('p') if article_content else []
-    # Extract the text from each paragraph
-    text = [p.get_text() for p in paragraphs]
-    return text
-# summay Inside Climate News
-def parse_insideclimatenews_article(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # Find the div with the specified class
-    entry_content = soup.find('div', class_='entry-content')
-    # Find all <p> tags within the div
-    paragraphs = entry_content.find_all('p') if entry_content else []
-    # Extract the text from each paragraph
-    text = [p.get_text() for p in paragraphs]
-    return text
-# summay CNN
-def parse_cnn_article(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # Find all <p> tags with the specified class
-    paragraphs = soup.find_all('p', class_='paragraph inline-placeholder vossi-paragraph-primary-core-light')
-    # Extract the text from each <p> tag
-    text = [p.get_text() for p in paragraphs]
-    return text
-# summay NPR
-def parse_npr_article(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # Find all the <p> tags
-    paragraphs = soup.find_all('p')
-    # Extract the text from each paragraph
-    text = [p.get_text() for p in paragraphs]
-    return text
-
-#Parsing functions for different websites' summary                     
-parsing_functions = {
-    'www3.nhk.or.jp': parse_nhk_article,
-    'www.bbc.com': parse_bbc_article,
-    'www.aljazeera.com': parse_aljazeera_article,
-    'www.cbsnews.com': parse_cbsnews_article,
-    'news.ntv.co.jp': parse_ntv_article,
-    'www.theguardian.com' : parse_guardian_article,
-    'news.un.org' : parse_un_article,
-    'www.un.org' : parse_un_sustainablity_article,
-    'www.unep.org' : parse_unep_article,
-    'www.politico.com' : parse_politico_article,
-    'www.cnbc.com' : parse_cnbc_article,    
-    'www.webmd.com': parse_webmd_article,
-    'www.enn.com': parse_enn_article,
-    'insideclimatenews.org': parse_insideclimatenews_article,
-    'www.cnn.com': parse_cnn_article,
-    'www.npr.org': parse_npr_article,
-    # Add more as needed
+    limit = max(1, min(request.args.get('limit', COMMENTS_PAGE_SIZE, type=int), COMMENTS_MAX_PAGE_SIZE))
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    etag = f'{article_id}-{version}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        page_key = f'{COMMENTS_PAGE_PREFIX}{article_id}:{version}:{limit}:{after}:{before}'
+        page = cache.get(page_key)
+        if page is None:
+            page = comments_page(article_id, limit, after, before)
+            cache.set(page_key, page, timeout=COMMENTS_CACHE_TIMEOUT)
+        response = jsonify(page)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # Browsers revalidate with If-None-Match on every poll
+    return response
+
+#Request headers for sites that refuse the default requests User-Agent
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.97 Safari/537.36',
 }
 
-#Settings for AI models
-def summarize_article(article, url):
-    try:
-        # Choose the model and tokenizer based on the URL(Japan)
-        if 'www3.nhk.or.jp' in url or 'news.ntv.co.jp' in url:
-            model = japanese_model
-            tokenizer = japanese_tokenizer
+#Where the fields of an article are found, per article host. One BeautifulSoup pass over a page extracts all of them:
+#  image: rules tried in order, (css selector, attribute) or ('ld+json', dotted path into the page's ld+json,
+#         optionally prefixed with the @type of the block: 'NewsArticle:image.0.url')
+#  image_in_head: the image rules only need the <head> of the page (see fetch_page_head)
+#  feed_image: entry field ('media_thumbnail', 'media_content') preferred over the page image
+#  default_image: used when no image was found
+#  teaser: (css selector, max lines) of the short summary shown under the title
+#  feed_summary: ('words' or 'lines', count) to shorten the summary of the feed entry when there is no teaser
+#  body: css selector of the paragraphs sent to the AI by /summarize
+#  date: rules like image for the published date, DATE_RULES by default
+#  headers, encoding: passed to fetch_page
+SOURCES = {
+    'www3.nhk.or.jp': {
+        'image': [('ld+json', 'NewsArticle:image.0.url')], 'image_in_head': True,
+        'default_image': 'https://upload.wikimedia.org/wikipedia/commons/4/4c/NHK_logo_2020.svg',
+        'body': 'p.content--summary, div.body-text p', 'encoding': 'utf-8',
+    },
+    'www.bbc.com': {
+        'feed_image': 'media_thumbnail',
+        'default_image': 'https://upload.wikimedia.org/wikipedia/commons/thumb/e/ea/BBC_World_News_2022_%28Boxed%29.svg/800px-BBC_World_News_2022_%28Boxed%29.svg.png',
+        'teaser': ('p.sc-eb7bd5f6-0.fYAfXe', 3), 'body': 'p.sc-eb7bd5f6-0.fYAfXe',
+    },
+    'www.aljazeera.com': {
+        'image': [('ld+json', 'image.0.url')], 'image_in_head': True,
+        'default_image': 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQ9sXvoSpXCYsdA1qW74Q3uGp8CAN19bUWGoQ&s',
+        'body': 'div.wysiwyg.wysiwyg--all-content.css-ibbk12 p',
+    },
+    'www.cbsnews.com': {
+        'image': [('link[rel=preload][as=image]', 'href')], 'image_in_head': True,
+        'default_image': 'https://e7.pngegg.com/pngimages/901/52/png-clipart-cbs-corporation-logo-united-states-of-america-television-betting-television-text.png',
+        'feed_summary': ('lines', 1), 'body': 'section.content__body p',
+    },
+    'news.ntv.co.jp': {
+        'image': [('img', 'src')], 'default_image': 'https://www.ntv.co.jp/assets/images/meta/og-image.png',
+        'teaser': ('p.player-text', 2), 'body': 'p.player-text',
+    },
+    'www.theguardian.com': {
+        'feed_image': 'media_content',
+        'default_image': 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQR_E1vW-vT3q3rKzhtxt6MHMezjtmOp3_5dg&s',
+        'feed_summary': ('words', 40), 'body': 'p.dcr-iy9ec7, p.dcr-jdlpgv, p.dcr-shm5ll, p.dcr-ntq2eh',
+    },
+    'news.un.org': {
+        'body': 'div.clearfix.text-formatted.field.field--name-field-text-column.field--type-text-long.field--label-hidden.field__item p',
+    },
+    'www.un.org': {
+        'image': [('div.story-media picture img', 'src')],
+        'body': 'p.story-body__introduction:not(:has(span))',
+    },
+    'www.unep.org': {
+        'body': 'div.paragraph.paragraph--type--content.paragraph--view-mode--default p', 'headers': BROWSER_HEADERS,
+    },
+    'www.politico.com': {
+        'feed_image': 'media_content', 'image': [('img[data-lazy-img]', 'data-lazy-img')],
+        'default_image': 'https://www.politico.eu/wp-content/themes/politico/assets/images/politico-billboard.png',
+        'body': 'p.story-text__paragraph', 'headers': BROWSER_HEADERS,  # Error 403 without the browser headers
+    },
+    'www.cnbc.com': {
+        'image': [('ld+json', 'image.url')], 'image_in_head': True,
+        'default_image': 'https://upload.wikimedia.org/wikipedia/commons/4/4c/CNBC_logo.svg',
+        'body': 'div.group p',
+    },
+    'www.webmd.com': {
+        'feed_image': 'media_content', 'default_image': 'https://upload.wikimedia.org/wikipedia/commons/4/42/WebMD_logo.png',
+        'body': 'div.article-body div.article-page.active-page p', 'headers': BROWSER_HEADERS,
+    },
+    'www.enn.com': {
+        'image': [('span[itemprop=image] img', 'src')],
+        'default_image': 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcRQeKvQEJ5MwuooBe6-7nPSkDtezs7VbncS__YFxOB5Dkqioa-8fZpzEYYLKC9FtsQ1OKM&usqp=CAU',
+        'body': 'section.article-content[itemprop=articleBody] p',
+    },
+    'insideclimatenews.org': {
+        'image': [('ld+json', '@graph.0.thumbnailUrl')], 'image_in_head': True,
+        'default_image': 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcRQeKvQEJ5MwuooBe6-7nPSkDtezs7VbncS__YFxOB5Dkqioa-8fZpzEYYLKC9FtsQ1OKM&usqp=CAU',
+        'body': 'div.entry-content p',
+    },
+    'www.cnn.com': {
+        'image': [('ld+json', 'thumbnailUrl')], 'image_in_head': True,
+        'default_image': 'https://upload.wikimedia.org/wikipedia/commons/thumb/b/b1/CNN.svg/1200px-CNN.svg.png',
+        'body': 'p.paragraph.inline-placeholder.vossi-paragraph-primary-core-light',
+    },
+    'www.npr.org': {
+        'image': [('picture img', 'src')],
+        'default_image': 'https://upload.wikimedia.org/wikipedia/commons/thumb/d/d7/National_Public_Radio_logo.svg/1200px-National_Public_Radio_logo.svg.png',
+        'body': 'p',
+    },
+    'www.economist.com': {
+        'image': [('ld+json', 'image')], 'image_in_head': True,
+        'default_image': 'https://upload.wikimedia.org/wikipedia/commons/4/4c/Politico_logo.svg',
+    },
+}
+SOURCES['www.bbc.co.uk'] = SOURCES['www.bbc.com']
+DATE_RULES = [('ld+json', 'datePublished'), ('meta[property="article:published_time"]', 'content')]
+
+#Spec of the site an article URL belongs to, None for unknown sites
+def source_spec(url):
+    return SOURCES.get(urllib.parse.urlparse(url).netloc)
+
+#First string found at a dotted path ('image.0.url') in the ld+json blocks of a page
+#A 'Type:' prefix ('NewsArticle:image.0.url') only reads the items whose @type is Type
+def ld_json_value(blocks, path):
+    ld_type, _, path = path.rpartition(':')
+    for block in blocks:
+        for item in (block if isinstance(block, list) else [block]):
+            if ld_type and not (isinstance(item, dict) and ld_type in ld_json_types(item)):
+                continue
+            value = item
+            for key in path.split('.'):
+                if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+                    value = value[int(key)]
+                elif isinstance(value, dict) and key in value:
+                    value = value[key]
+                else:
+                    value = None
+                    break
+            if isinstance(value, str) and value:
+                return value
+    return None
+
+def ld_json_types(item):
+    types = item.get('@type')
+    return types if isinstance(types, list) else [types]
+
+#Value of the first rule that matches the page
+def first_match(soup, blocks, rules):
+    for selector, attribute in rules:
+        if selector == 'ld+json':
+            value = ld_json_value(blocks, attribute)
         else:
-            model = english_model  
-            tokenizer = english_tokenizer  
+            tag = soup.select_one(selector)
+            value = tag.get(attribute) if tag is not None else None
+        if value:
+            return value
+    return None
+
+EMPTY_PAGE_FIELDS = {'image_url': None, 'teaser': None, 'body': None, 'date': None, 'full': False}
+
+#Extracts every field of an article page in one pass, `page_html` may only hold the <head> of the page
+def extract_page_fields(url, page_html):
+    spec = source_spec(url) or {}
+    soup = BeautifulSoup(page_html, 'html.parser')
+    blocks = []  # The ld+json blocks are decoded once for every rule
+    for script_tag in soup.find_all('script', type='application/ld+json'):
+        try:
+            blocks.append(json.loads(script_tag.string or ''))
+        except ValueError:
+            continue
+    image_url = first_match(soup, blocks, spec.get('image', []))
+    teaser = None
+    if 'teaser' in spec:
+        selector, max_lines = spec['teaser']
+        tag = soup.select_one(selector)
+        if tag is not None:
+            lines = tag.get_text(separator='\n').split('\n')
+            teaser = '\n'.join(lines[:max_lines]) + '...'
+    body = None
+    if 'body' in spec:
+        body = [tag.get_text() for tag in soup.select(spec['body'])] or None
+    return {
+        'image_url': urllib.parse.urljoin(url, image_url) if image_url else None,  # Also fixes protocol-relative URLs
+        'teaser': teaser,
+        'body': body,
+        'date': first_match(soup, blocks, spec.get('date', DATE_RULES)),
+    }
 
-        # Split the article into chunks of max_position_embeddings tokens
-        chunk_size = getattr(model.config, 'max_position_embeddings', 512)  # Use 512 as default if attribute does not exist
-        chunks = [article[i:i + chunk_size] for i in range(0, len(article), chunk_size)]
+#Extracts the fields of a page and keeps them in the page store for PAGE_STORE_FRESH, so feed refresh, the routes
+#and /summarize share them. They are not put in the cache, where one key per article would fill it up
+#`full` tells whether the whole page was read or only its head
+def cache_page_fields(url, page_html, full):
+    fields = extract_page_fields(url, page_html)
+    fields['full'] = full
+    if any(fields[key] for key in ('image_url', 'teaser', 'body', 'date')):  # Error pages are not stored
+        page_store.put_fields(url, fields)
+    return fields
+
+#Paths of the image rules of a source that read ld+json, fetch_page_head keeps reading until one of them resolves
+def ld_json_paths(spec):
+    return [path for selector, path in spec.get('image', []) if selector == 'ld+json']
+
+#Returns the fields of an article page, only downloading its head when that is enough and `full` is not set
+def page_fields(url, full=False):
+    fields = page_store.get_fields(url)
+    if fields is not None and (fields['full'] or not full):
+        return fields
+    spec = source_spec(url) or {}
+    if full or not spec.get('image_in_head'):
+        page_html = fetch_page(url, headers=spec.get('headers'), encoding=spec.get('encoding'))
+        return cache_page_fields(url, page_html, True)
+    page_html = fetch_page_head(url, headers=spec.get('headers'), ld_json_paths=ld_json_paths(spec), encoding=spec.get('encoding'))
+    return cache_page_fields(url, page_html, False)
+
+#Returns the fields of many article pages concurrently, as a dict of url -> fields (EMPTY_PAGE_FIELDS when a page failed)
+def fetch_page_fields(urls, full=False):
+    futures = {}
+    for url in urls:
+        if url not in futures:
+            futures[url] = page_fetch_executor.submit(page_fields, url, full)
+    fields = {}
+    for url, future in futures.items():
+        try:
+            fields[url] = future.result()
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Could not fetch {url}: {e}")
+            fields[url] = EMPTY_PAGE_FIELDS
+    return fields
+
+#Async version of page_fields for the feed refresh
+async def page_fields_async(session, url):
+    loop = asyncio.get_running_loop()
+    fields = await loop.run_in_executor(parse_executor, page_store.get_fields, url)
+    if fields is not None:
+        return fields
+    spec = source_spec(url) or {}
+    if spec.get('image_in_head'):
+        page_html = await fetch_head(session, url, ld_json_paths=ld_json_paths(spec), encoding=spec.get('encoding'))
+        return await loop.run_in_executor(parse_executor, cache_page_fields, url, page_html, False)
+    page_html = await fetch(session, url)
+    return await loop.run_in_executor(parse_executor, cache_page_fields, url, page_html, True)
+
+#Shortens the summary of a feed entry to its first words or lines
+def shorten_feed_summary(summary, unit, count):
+    text = BeautifulSoup(summary, 'html.parser').get_text()
+    if unit == 'words':
+        return ' '.join(text.split()[:count]) + ',continued ... '
+    return '\n'.join(text.split('\n')[:count])
+
+#Image of an article page, or the default image of its site
+def page_image(url, fields):
+    return fields['image_url'] or (source_spec(url) or {}).get('default_image')
+
+#Sets the image and summary of a feed entry from the fields of its article page and the spec of its site
+def enrich_entry(entry, fields):
+    spec = source_spec(entry.get('link', '')) or {}
+    feed_image = entry.get(spec['feed_image']) if 'feed_image' in spec else None
+    if feed_image:
+        entry['image_url'] = feed_image[0]['url']
+    elif page_image(entry.get('link', ''), fields):
+        entry['image_url'] = page_image(entry.get('link', ''), fields)
+    if fields['teaser']:
+        entry['summary'] = fields['teaser']
+    elif 'summary' in entry and 'feed_summary' in spec:
+        entry['summary'] = shorten_feed_summary(entry['summary'], *spec['feed_summary'])
+    if 'summary' in entry:
+        entry['summary'] = html.unescape(entry['summary'])
+
+#True when the fields of a feed entry come from its article page, not only from the feed
+def needs_page(url):
+    spec = source_spec(url) or {}
+    return 'image' in spec or 'teaser' in spec
+
+#Settings for batched summarization
+SUMMARY_BATCH_SIZE = 8  # Max number of texts summarized by one generate call
+SUMMARY_BATCH_WAIT = 0.01  # Seconds a batch waits for more requests before it runs
+SUMMARY_TIMEOUT = 120  # Max seconds a request waits for its summaries
+
+#Runs one padded, batched generate call and returns a summary per text
+def generate_summaries(model, tokenizer, texts, max_length=100, min_length=40):
+    import torch
+    inputs = tokenizer(texts, max_length=1024, padding=True, truncation=True, return_tensors='pt')
+    with torch.no_grad():
+        summary_ids = model.generate(inputs['input_ids'], attention_mask=inputs['attention_mask'],
+                                     num_beams=4, max_length=max_length, min_length=min_length, early_stopping=True)
+    return tokenizer.batch_decode(summary_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)
+
+#Queues summarization requests for one model and runs them together as padded, batched generate calls
+class SummaryBatcher:
+    def __init__(self, model_name, max_batch_size=SUMMARY_BATCH_SIZE, max_wait=SUMMARY_BATCH_WAIT):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    #Queues a text and returns a Future that will hold its summary
+    def submit(self, text, max_length=100, min_length=40):
+        future = Future()
+        self.requests.put((text, max_length, min_length, future))
+        return future
+
+    #Summarizes several texts and waits for all of them, at most SUMMARY_TIMEOUT seconds
+    def summarize(self, texts, max_length=100, min_length=40):
+        futures = [self.submit(text, max_length, min_length) for text in texts]
+        deadline = time.monotonic() + SUMMARY_TIMEOUT
+        try:
+            return [future.result(timeout=max(deadline - time.monotonic(), 0)) for future in futures]
+        except FutureTimeoutError:
+            for future in futures:
+                future.cancel()  # Cancelled requests are dropped from their batch
+            raise
+
+    #Worker loop: collects requests for up to max_wait seconds, then generates their summaries together
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.generate(batch)
+
+    def generate(self, batch):
+        # Requests with different length settings cannot share a generate call
+        groups = {}
+        for text, max_length, min_length, future in batch:
+            if future.set_running_or_notify_cancel():
+                groups.setdefault((max_length, min_length), []).append((text, future))
+        for (max_length, min_length), group in groups.items():
+            try:
+                model, tokenizer = model_registry.get(self.model_name)
+                summaries = generate_summaries(model, tokenizer, [text for text, _ in group], max_length, min_length)
+                for (_, future), summary in zip(group, summaries):
+                    future.set_result(summary)
+            except Exception as e:
+                for _, future in group:
+                    future.set_exception(e)
+
+#One batching queue per model
+summary_batchers = {name: SummaryBatcher(name) for name in SUMMARY_MODELS}
+
+#Choose the model based on the URL(Japan)
+def summary_model_name(url):
+    if 'www3.nhk.or.jp' in url or 'news.ntv.co.jp' in url:
+        return 'japanese'
+    return 'english'
+
+SUMMARY_REDUCE_TOKENS = 400  # Joined chunk summaries longer than this (in tokens) are summarized again
+
+#Number of article tokens that fit in one model input
+def model_input_limit(model, tokenizer):
+    limit = getattr(model.config, 'max_position_embeddings', None) or 512  # T5 has no absolute positions, 512 is its training length
+    limit = min(limit, tokenizer.model_max_length, 1024)
+    return limit - tokenizer.num_special_tokens_to_add()
+
+#Packs the paragraphs of an article into as few chunks as possible, each holding at most `limit` tokens
+def chunk_article(article, tokenizer, limit):
+    paragraphs = article if isinstance(article, list) else article.split('\n')
+    paragraphs = [p.strip() for p in paragraphs if p and p.strip()]
+    if not paragraphs:
+        return []
+    token_ids = tokenizer(paragraphs, add_special_tokens=False)['input_ids']
+    chunks = []
+    current, current_tokens = [], 0
+    for paragraph, ids in zip(paragraphs, token_ids):
+        if len(ids) > limit:
+            # A paragraph longer than the model input is cut into windows of `limit` tokens
+            pieces = [(tokenizer.decode(ids[i:i + limit]), len(ids[i:i + limit])) for i in range(0, len(ids), limit)]
+        else:
+            pieces = [(paragraph, len(ids))]
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > limit:
+                chunks.append(' '.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+#Max number of tokens of one generated summary
+def summary_max_length(model):
+    try:
+        return min(100, model.config.max_position_embeddings)
+    except AttributeError:
+        return 100  # Default value if 'max_position_embeddings' does not exist
 
-        summaries = []
-        for chunk in chunks:
-            # Ensure chunk is a single string
-            if isinstance(chunk, list):
-                chunk = ' '.join(chunk)
+#Settings for AI models
+def summarize_article(article, url):
+    try:
+        model_name = summary_model_name(url)
+        batcher = summary_batchers[model_name]
+        model, tokenizer = model_registry.get(model_name)
 
-            # Tokenize the chunk
-            inputs = tokenizer([chunk], max_length=1024 , return_tensors='pt', truncation=True)
+        # Split the article into chunks packed close to the model's real token limit
+        limit = model_input_limit(model, tokenizer)
+        chunks = chunk_article(article or [], tokenizer, limit)
+        if not chunks:
+            return None
 
-            # Generate a summarized version of the chunk
-            try:
-                max_length = min(100, model.config.max_position_embeddings)
-            except AttributeError:
-                max_length = 100  # Default value if 'max_position_embeddings' does not exist
+        max_length = summary_max_length(model)
 
-            summary_ids = model.generate(inputs['input_ids'], num_beams=4, max_length=max_length, min_length=40, early_stopping=True)
-            summary = [tokenizer.decode(g, skip_special_tokens=True, clean_up_tokenization_spaces=False) for g in summary_ids]
+        # Map: all chunks are queued at once so they share generate calls with each other and with other requests
+        summaries = batcher.summarize(chunks, max_length=max_length, min_length=40)
 
-            summaries.append(summary[0])
+        # Reduce: summarize the chunk summaries again until they are short enough, which bounds the output for very long pieces
+        while len(summaries) > 1 and len(tokenizer(' '.join(summaries), add_special_tokens=False)['input_ids']) > SUMMARY_REDUCE_TOKENS:
+            chunks = chunk_article(summaries, tokenizer, limit)
+            reduced = batcher.summarize(chunks, max_length=max_length, min_length=40)
+            if len(reduced) >= len(summaries):
+                break  # No progress, keep what we have
+            summaries = reduced
 
         # Join the summaries together and return the result
         return ' '.join(summaries)
@@ -531,155 +1758,236 @@ def summarize_article(article, url):
         print(traceback.format_exc())
         return None
 
+#Settings for the summary cache
+SUMMARY_CACHE_TTL = timedelta(days=7)  # Summaries older than this are always regenerated
+SUMMARY_CACHE_RECHECK = timedelta(minutes=30)  # How long a summary is served before the article text is checked again
+SUMMARY_CACHE_MAX_ENTRIES = 5000  # The least recently used summaries above this size are evicted
+
+#Hash of the extracted article text, used to notice when an article has been edited
+def article_text_hash(article):
+    if isinstance(article, list):
+        article = '\n'.join(article)
+    return hashlib.sha256((article or '').encode('utf-8')).hexdigest()
+
+#Returns the cached summary for an article, dropping it once it is older than SUMMARY_CACHE_TTL
+def lookup_summary(url, model_name):
+    cached = Summary.query.filter_by(url=url, model_name=model_name).first()
+    if cached is not None and datetime.now() - cached.created_at > SUMMARY_CACHE_TTL:
+        db.session.delete(cached)
+        db.session.commit()
+        return None
+    return cached
+
+#Marks a cached summary as used (and, when the article text was compared again, as checked)
+def touch_summary(cached, checked=False):
+    now = datetime.now()
+    cached.last_used = now
+    if checked:
+        cached.checked_at = now
+    db.session.commit()
+
+#Stores a new summary, replacing the outdated one, and keeps the cache within SUMMARY_CACHE_MAX_ENTRIES
+def save_summary(cached, url, model_name, content_hash, summary):
+    now = datetime.now()
+    if cached is None:
+        cached = Summary(url=url, model_name=model_name)
+        db.session.add(cached)
+    cached.content_hash = content_hash
+    cached.summary = summary
+    cached.created_at = cached.checked_at = cached.last_used = now
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # Another request stored the same summary first
+        return
+    overflow = Summary.query.count() - SUMMARY_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        oldest = db.session.query(Summary.id).order_by(Summary.last_used).limit(overflow)
+        Summary.query.filter(Summary.id.in_(oldest.scalar_subquery())).delete(synchronize_session=False)
+        db.session.commit()
+
+#Settings for summary jobs
+#Threads that scrape and summarize articles, so HTTP workers are never held by inference. Scraping is I/O and the
+#batcher serializes inference, so by default there are enough jobs to fill one batch with chunks of different articles
+SUMMARY_JOB_WORKERS = int(os.environ.get('SUMMARY_JOB_WORKERS', str(SUMMARY_BATCH_SIZE)))
+SUMMARY_JOB_TTL = 600  # Seconds the state of a job stays available to clients
+SUMMARY_JOB_PREFIX = 'summary_job:'
+SUMMARY_JOB_FOR_URL_PREFIX = 'summary_job_for:'
+summary_job_executor = ThreadPoolExecutor(max_workers=SUMMARY_JOB_WORKERS, thread_name_prefix='summary-job')
+
+#Job state is kept in the shared cache, so any worker can answer the polling / SSE requests
+def set_summary_job(job_id, status, **fields):
+    cache.set(SUMMARY_JOB_PREFIX + job_id, dict(status=status, **fields), timeout=SUMMARY_JOB_TTL)
+
+#Scrapes and summarizes an article in the job pool, then stores the result in the job
+def run_summary_job(job_id, url):
+    with app.app_context():
+        try:
+            set_summary_job(job_id, 'running')
+            model_name = summary_model_name(url)
+            cached = lookup_summary(url, model_name)
+            article = page_fields(url, full=True)['body']
+            # The cached summary is still valid as long as the article text has not changed
+            content_hash = article_text_hash(article)
+            if cached is not None and cached.content_hash == content_hash:
+                touch_summary(cached, checked=True)
+                set_summary_job(job_id, 'done', summary=cached.summary)
+                return
+            # Send the article to the AI for summarization
+            summary = summarize_article(article, url)  # Pass the URL to summarize_article
+            if summary is None:
+                set_summary_job(job_id, 'error', error='Error summarizing article')
+                return
+            save_summary(cached, url, model_name, content_hash, summary)
+            set_summary_job(job_id, 'done', summary=summary)
+        except Exception as e:
+            print("Error in summary job:", str(e))
+            print(traceback.format_exc())
+            set_summary_job(job_id, 'error', error='Server error')
+        finally:
+            cache.delete(SUMMARY_JOB_FOR_URL_PREFIX + url)
+
 #Summarize the article by sending it to AI models
+#Answers at once with a cached summary, otherwise with the id of a job the client polls or follows over SSE
 @app.route('/summarize', methods=['POST'])
 def summarize():
     try:
         url = request.form.get('url')
-        # Determine which parsing function to use
-        base_url = urllib.parse.urlparse(url).netloc
-        parse_article = parsing_functions.get(base_url)
-        if parse_article is None:
+        # Only sites with a body selector in SOURCES can be summarized
+        spec = source_spec(url)
+        if spec is None or 'body' not in spec:
             return jsonify(error='No article has been found'), 400
 
-        article = parse_article(url)
-        # Send the article to the AI for summarization
-        summary = summarize_article(article, url)  # Pass the URL to summarize_article
-        if summary is None:
-            return jsonify(error='Error summarizing article'), 500
-
-        return jsonify(summary=summary)
+        # Serve a recently checked summary without scraping the article again
+        cached = lookup_summary(url, summary_model_name(url))
+        if cached is not None and datetime.now() - cached.checked_at < SUMMARY_CACHE_RECHECK:
+            touch_summary(cached)
+            return jsonify(summary=cached.summary)
+
+        # Clicks on an article that is already being summarized join the running job
+        # cache.add only succeeds for the first click, so two clicks never both start a job
+        job_id = uuid.uuid4().hex
+        set_summary_job(job_id, 'pending')  # Set first, so a click joining the job always finds its state
+        for _ in range(2):
+            if cache.add(SUMMARY_JOB_FOR_URL_PREFIX + url, job_id, timeout=SUMMARY_JOB_TTL):
+                summary_job_executor.submit(run_summary_job, job_id, url)
+                break
+            running_id = cache.get(SUMMARY_JOB_FOR_URL_PREFIX + url)
+            if running_id is not None and cache.get(SUMMARY_JOB_PREFIX + running_id) is not None:
+                cache.delete(SUMMARY_JOB_PREFIX + job_id)
+                job_id = running_id
+                break
+            cache.delete(SUMMARY_JOB_FOR_URL_PREFIX + url)  # Left by a job whose state expired, take its place
+        else:
+            set_summary_job(job_id, 'error', error='Server busy, please retry')  # Lost the race twice, never leave the job pending
+        return jsonify(job_id=job_id,
+                       status_url=url_for('summary_job_status', job_id=job_id),
+                       events_url=url_for('summary_job_events', job_id=job_id)), 202
     except Exception as e:
 
         return jsonify(error='Server error'), 500
 
+#State of a summary job: pending, running, done (with the summary) or error
+@app.route('/summarize/<job_id>', methods=['GET'])
+def summary_job_status(job_id):
+    job = cache.get(SUMMARY_JOB_PREFIX + job_id)
+    if job is None:
+        return jsonify(error='Job not found'), 404
+    return jsonify(job)
+
+#Server-sent events of a summary job. Each connection answers the current state at once and ends, the browser
+#reconnects after SUMMARY_EVENTS_RETRY_MS, so no worker is held while the job runs. The event id is the status,
+#so a reconnection sends no data until the status has changed
+SUMMARY_EVENTS_RETRY_MS = 1000
+
+@app.route('/summarize/<job_id>/events', methods=['GET'])
+def summary_job_events(job_id):
+    job = cache.get(SUMMARY_JOB_PREFIX + job_id) or {'status': 'error', 'error': 'Job not found'}
+    body = f"retry: {SUMMARY_EVENTS_RETRY_MS}\n\n"
+    if job['status'] != request.headers.get('Last-Event-ID'):
+        body += f"id: {job['status']}\ndata: {json.dumps(job)}\n\n"
+    return Response(body, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+#Liveness: the process answers, and in the leader the refresh daemon is still running
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    leader = refresh_daemon.thread is not None
+    alive = not leader or refresh_daemon.thread.is_alive()
+    return jsonify(status='ok' if alive else 'refresh daemon stopped', leader=leader), 200 if alive else 503
+
+#Readiness: there is something to serve, at least one feed has been refreshed by this leader, a previous run or
+#another worker. Also reports the age of every feed
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    now = time.time()
+    sources = {}
+    for url in URLS:
+        refreshed_at = cache.get(FEED_REFRESHED_PREFIX + url)
+        age = None if refreshed_at is None else round(now - refreshed_at)
+        sources[url] = {'age_seconds': age, 'stale': age is None or age > 2 * REFRESH_INTERVAL}
+    ready = any(source['age_seconds'] is not None for source in sources.values())
+    return jsonify(ready=ready, cache_ready=cache_ready, sources=sources), 200 if ready else 503
+
+#Load time and memory of the AI models
+@app.route('/models', methods=['GET'])
+def models_status():
+    return jsonify(model_registry.status())
+
+#Outbound request counters and backoff state per host
+@app.route('/hosts', methods=['GET'])
+def hosts_status():
+    return jsonify(host_limiter.status())
+
 @app.route("/")
 def home():
     print("Rendering home page...")
-    entries = []
-    for url in URLS:
-        feed_entries = cache.get(url)
-        if feed_entries is not None:
-            for entry in feed_entries:
-                if entry['publish_date'] is not None:
-                    try:
-                        entry['publish_date'] = parse(str(entry['publish_date']))
-                    except (ValueError, ParserError):
-                        entry['publish_date'] = None
-            entries.extend(feed_entries)
-    far_future = datetime.now() + timedelta(days=100*365) #Give articles without a publish date a far future date
-    entries.sort(key=lambda e: e['publish_date'] if e['publish_date'] is not None else far_future, reverse=True)
+    entries = cache.get(HOME_TIMELINE_KEY)
+    if entries is None:  # Only before the first refresh has finished
+        entries = build_home_timeline(store=False)
     print("Home page rendered successfully...")
     return render_template('IN Homepage.html', feed=entries)
 
 #Different Agencies
 @app.route("/CNN")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def CNN():
-    feed = feedparser.parse('http://rss.cnn.com/rss/cnn_latest.rss')
+    feed, _ = fetch_feed('http://rss.cnn.com/rss/cnn_latest.rss')
     entries = []
-    articles = []  # Initialize the articles list
+    fields = fetch_page_fields(entry['link'] for entry in feed.entries)  # Extract all article pages concurrently
     for entry in feed.entries:
-        response = requests.get(entry['link'])
-        soup = BeautifulSoup(response.text, 'html.parser')
-        json_script = soup.find('script', type='application/ld+json')
-        image_url = None
-        if json_script:
-            data = json.loads(json_script.string)
-            if isinstance(data, dict):
-                image_url = data.get('thumbnailUrl')
-            elif isinstance(data, list):
-                for item in data:
-                    if isinstance(item, dict):
-                        image_url = item.get('thumbnailUrl')
-                        if image_url:
-                            break
-        if image_url:
-            entry['image_url'] = image_url
-        else:
-            entry['image_url'] = 'https://upload.wikimedia.org/wikipedia/commons/thumb/b/b1/CNN.svg/1200px-CNN.svg.png'
-        # Check if an article with the same URL already exists in the database
-        article = Article.query.filter_by(url=entry.link).first()
-        # If not, create a new Article instance and add it to the database
-        if article is None:
-            article = Article(
-                title=entry.title,
-                url=entry.link,
-                published_date=datetime(*entry.published_parsed[:6])  # Convert time_struct to datetime
-            )
-            db.session.add(article)
-            db.session.flush()  # Flush the session to assign an ID to the article
-        # Add the Article instance to the entry
-        entry['article'] = article
-        entries.append(entry)
-        articles.append(article)
-        # Check if the article is in the database
-        #article_in_db = Article.query.get(article.id)
-        #if article_in_db is not None:
-            #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-        #else:
-            #print(f"Article is not in the database: {article.id}")  # Debug statemente database
-    db.session.commit()
+        entry['image_url'] = page_image(entry['link'], fields[entry['link']])
+        entries.append(FeedEntry.from_entry(entry))
+    # Look up or create the Article rows of all entries at once
+    articles = attach_articles(entries)
 
     return render_template('All_agencies/CNN.html', feed=entries, articles=articles)
 
 @app.route("/BBC")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def BBC():
     urls = ['http://feeds.bbci.co.uk/news/rss.xml', 'http://feeds.bbci.co.uk/news/world/rss.xml']
     entries = []
-    articles = []  # Initialize the articles list
-    for url in urls:
-        feed = feedparser.parse(url)
+    feeds = [fetch_feed(url)[0] for url in urls]
+    fields = fetch_page_fields(entry.link for feed in feeds for entry in feed.entries[:10])  # Extract all article pages concurrently
+    for feed in feeds:
         for i, entry in enumerate(feed.entries):
             if i < 10 :  # Only process the first 10 entries
-                if 'media_thumbnail' in entry and len(entry['media_thumbnail']) > 0:
-                    entry['image_url'] = entry['media_thumbnail'][0]['url']
-                else:
-                    entry['image_url'] = 'https://upload.wikimedia.org/wikipedia/commons/thumb/e/ea/BBC_World_News_2022_%28Boxed%29.svg/800px-BBC_World_News_2022_%28Boxed%29.svg.png'
-                response = requests.get(entry.link)
-                soup = BeautifulSoup(response.text, 'html.parser') 
-                # Find the <p> tag with class 'player-text' and extract its text
-                p_tag = soup.find('p', class_='sc-eb7bd5f6-0 fYAfXe')
-                if p_tag is not None:
-                    lines = p_tag.get_text(separator='\n').split('\n')
-                    entry['summary'] = '\n'.join(lines[:3]) + '...'
-
-                # Check if an article with the same URL already exists in the database
-                article = Article.query.filter_by(url=entry.link).first()
-                # If not, create a new Article instance and add it to the database
-                if article is None:
-                    article = Article(
-                        title=entry.title,
-                        url=entry.link,
-                        published_date=datetime(*entry.published_parsed[:6])  # Convert time_struct to datetime
-                    )
-                    db.session.add(article)
-                    db.session.flush()  # Flush the session to assign an ID to the article
-                # Add the Article instance to the entry
-                entry['article'] = article
-                entries.append(entry)
-                articles.append(article)
-                # Check if the article is in the database
-                #article_in_db = Article.query.get(article.id)
-                #if article_in_db is not None:
-                    #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-                #else:
-                    #print(f"Article is not in the database: {article.id}")  # Debug statemente database
-    db.session.commit()
+                enrich_entry(entry, fields[entry.link])  # Feed thumbnail and the teaser of the article
+                entries.append(FeedEntry.from_entry(entry))
+    # Look up or create the Article rows of all entries at once
+    articles = attach_articles(entries)
 
     # Sort the entries based on their published time
     entries = sorted(entries, key=lambda e: e.published_parsed, reverse=True)
     return render_template('All_agencies/BBC.html', feed=entries, articles=articles)
 
 @app.route("/Guardian")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def Guardian():
     urls = ['https://www.theguardian.com/uk/rss','https://www.theguardian.com/world/rss']
     entries = []
-    articles = []  # Initialize the articles list
     for url in urls:
-        feed = feedparser.parse(url)
+        feed, _ = fetch_feed(url)
         for entry in feed.entries:
             if 'media_content' in entry and len(entry['media_content']) > 0:
                 entry['image_url'] = entry['media_content'][0]['url']
@@ -692,337 +2000,163 @@ def Guardian():
             summary_words = summary_text.split()  # Split the text by spaces to get a list of words
             max_words = 75  # Set your desired maximum number of words
             entry['summary'] = ' '.join(summary_words[:max_words]) + ',continued ... '
-            article = Article.query.filter_by(url=entry.link).first()
-            # If not, create a new Article instance and add it to the database
-            if article is None:
-                if 'published_parsed' in entry:
-                    published_date = datetime(*entry.published_parsed[:6])  # Convert time_struct to datetime
-                else:
-                    published_date = datetime.now()
-                article = Article(
-                    title=entry.title,
-                    url=entry.link,
-                    published_date=published_date  
-                )
-                db.session.add(article)
-                db.session.flush()  # Flush the session to assign an ID to the article
-            # Add the Article instance to the entry
-            entry['article'] = article
-            entries.append(entry)
-            articles.append(article)
-            # Check if the article is in the database
-            #article_in_db = Article.query.get(article.id)
-            #if article_in_db is not None:
-                #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-            #else:
-                #print(f"Article is not in the database: {article.id}")  # Debug statemente database
-    db.session.commit()
+            entries.append(FeedEntry.from_entry(entry))
+    # Look up or create the Article rows of all entries at once
+    articles = attach_articles(entries)
 
     # Sort the entries based on their published time
     entries = sorted(entries, key=lambda e: e.published_parsed, reverse=True)
     return render_template('All_agencies/Guardian.html', feed=entries, articles=articles)
 
 @app.route("/NPR")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def NPR():
-    feed = feedparser.parse('https://www.npr.org/rss/rss.php?id=1001')
+    feed, _ = fetch_feed('https://www.npr.org/rss/rss.php?id=1001')
     entries = []
-    articles = []  # Initialize the articles list
+    fields = fetch_page_fields(entry.link for entry in feed.entries)  # Extract all article pages concurrently
     for entry in feed.entries:
-        response = requests.get(entry.link)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find the first <picture> tag
-        picture_tag = soup.find('picture')
-        if picture_tag:
-            # Find the first <img> tag within the <picture> tag
-            img_tag = picture_tag.find('img')
-            if img_tag and 'src' in img_tag.attrs:
-                # If an image URL is found, add it to the entry
-                entry['image_url'] = img_tag['src']
-            else:
-                # If no image URL is found, use a default image URL
-                entry['image_url'] = 'https://upload.wikimedia.org/wikipedia/commons/thumb/d/d7/National_Public_Radio_logo.svg/1200px-National_Public_Radio_logo.svg.png'
-        article = Article.query.filter_by(url=entry.link).first()
-        # If not, create a new Article instance and add it to the database
-        if article is None:
-            if 'published_parsed' in entry:
-                published_date = datetime(*entry.published_parsed[:6])  # Convert time_struct to datetime
-            else:
-                published_date = datetime.now()
-            article = Article(
-                title=entry.title,
-                url=entry.link,
-                published_date=published_date  
-            )
-            db.session.add(article)
-            db.session.flush()  # Flush the session to assign an ID to the article
-        # Add the Article instance to the entry
-        entry['article'] = article
-        entries.append(entry)
-        articles.append(article)
-        # Check if the article is in the database
-        #article_in_db = Article.query.get(article.id)
-        #if article_in_db is not None:
-            #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-        #else:
-            #print(f"Article is not in the database: {article.id}")  # Debug statemente database
-    db.session.commit()
+        entry['image_url'] = page_image(entry.link, fields[entry.link])
+        entries.append(FeedEntry.from_entry(entry))
+    # Look up or create the Article rows of all entries at once
+    articles = attach_articles(entries)
     return render_template('All_agencies/NPR.html', feed=entries, articles=articles)
 
 @app.route("/CBS")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def CBS():
-    feed = feedparser.parse('https://www.cbsnews.com/latest/rss/main')
+    feed, _ = fetch_feed('https://www.cbsnews.com/latest/rss/main')
     entries = []
-    articles = []  # Initialize the articles list
+    fields = fetch_page_fields(entry.link for entry in feed.entries)  # Extract all article pages concurrently
     for entry in feed.entries:
-        response = requests.get(entry.link)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        image_tag = soup.find('link', {'rel': 'preload', 'as': 'image'})
-        if image_tag:
-            entry['image_url'] = image_tag['href']
-        else:
-            entry['image_url'] = 'https://e7.pngegg.com/pngimages/901/52/png-clipart-cbs-corporation-logo-united-states-of-america-television-betting-television-text.png'
-        # Check if an article with the same URL already exists in the database
-        article = Article.query.filter_by(url=entry.link).first()
-        if article is None:
-            if 'published_parsed' in entry:
-                published_date = datetime(*entry.published_parsed[:6])  # Convert time_struct to datetime
-            else:
-                published_date = datetime.now()
-            article = Article(
-                title=entry.title,
-                url=entry.link,
-                published_date=published_date  
-            )
-            db.session.add(article)
-            db.session.flush()  # Flush the session to assign an ID to the article
-        # Add the Article instance to the entry
-        entry['article'] = article
-        entries.append(entry)
-        articles.append(article)
-        # Check if the article is in the database
-        #article_in_db = Article.query.get(article.id)
-        #if article_in_db is not None:
-            #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-        #else:
-            #print(f"Article is not in the database: {article.id}")  # Debug statement
-    db.session.commit()
+        entry['image_url'] = page_image(entry.link, fields[entry.link])
+        entries.append(FeedEntry.from_entry(entry))
+    # Look up or create the Article rows of all entries at once
+    articles = attach_articles(entries)
     return render_template('All_agencies/CBS.html', feed=entries, articles=articles)
 
 @app.route("/NewYorkTimes")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def NewYorkTimes():
     urls = ['https://rss.nytimes.com/services/xml/rss/nyt/HomePage.xml', 'https://rss.nytimes.com/services/xml/rss/nyt/World.xml','https://rss.nytimes.com/services/xml/rss/nyt/AsiaPacific.xml']
     entries = []
-    articles = []  # Initialize the articles list
     for url in urls:
-        feed = feedparser.parse(url)
+        feed, _ = fetch_feed(url)
         for entry in feed.entries:
             if 'media_content' in entry and len(entry['media_content']) > 0:
                 entry['image_url'] = entry['media_content'][0]['url']
             else:
                 entry['image_url'] = 'https://ropercenter.cornell.edu/sites/default/files/styles/800x600/public/Images/New-York-Times-Logo8x6_0.png?itok=7YqGOSMA'
-        # Check if an article with the same URL already exists in the database
-        article = Article.query.filter_by(url=entry.link).first()
-        if article is None:
-            if 'published_parsed' in entry:
-                published_date = datetime(*entry.published_parsed[:6])  # Convert time_struct to datetime
-            else:
-                published_date = datetime.now()
-            article = Article(
-                title=entry.title,
-                url=entry.link,
-                published_date=published_date  
-            )
-            db.session.add(article)
-            db.session.flush()  # Flush the session to assign an ID to the article
-        # Add the Article instance to the entry
-        entry['article'] = article
-        entries.append(entry)
-        articles.append(article)
-        # Check if the article is in the database
-        #article_in_db = Article.query.get(article.id)
-        #if article_in_db is not None:
-            #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-        #else:
-            #print(f"Article is not in the database: {article.id}")  # Debug statement
-    db.session.commit()
+            entries.append(FeedEntry.from_entry(entry))
+    # Look up or create the Article rows of all entries at once
+    articles = attach_articles(entries)
     # Sort the entries based on their published time
     entries = sorted(entries, key=lambda e: e.published_parsed, reverse=True)
     return render_template('All_agencies/NewYorkTimes.html', feed=entries,articles=articles)
     
 @app.route("/NHK") 
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def NHK():   
     urls = ['https://www.nhk.or.jp/rss/news/cat0.xml', 'https://www.nhk.or.jp/rss/news/cat-live.xml', 'https://www.nhk.or.jp/rss/news/cat4.xml']  
-    articles = []
     entries = []
-    for url in urls:
-        feed = feedparser.parse(url)
+    feeds = [fetch_feed(url)[0] for url in urls]
+    # Get the current time
+    current_time = datetime.now(pytz.UTC)
+    # Only download the pages of entries published in the last 90 hours
+    recent_links = [entry.link for feed in feeds for entry in feed.entries
+                    if current_time - pytz.UTC.localize(datetime(*entry.published_parsed[:6])) <= timedelta(hours=90)]
+    fields = fetch_page_fields(recent_links)  # Extract all article pages concurrently
+    for feed in feeds:
         for entry in feed.entries:
             published_time = datetime(*entry.published_parsed[:6])
             published_time = pytz.UTC.localize(published_time)
 
-            # Get the current time
-            current_time = datetime.now(pytz.UTC)
             # Only process the entry if it was published in the last 90 hours
             if current_time - published_time > timedelta(hours=90):
                 continue  # Skip this entry
             # Only process the entry if it was published in the last 24 hours
             if current_time - published_time <= timedelta(hours=90):
-                response = requests.get(entry.link)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                entry['image_url'] = 'https://upload.wikimedia.org/wikipedia/commons/4/4c/NHK_logo_2020.svg'
-                script_tags = soup.find_all('script', type='application/ld+json')  # Find all script tags with type 'application/ld+json'
-                for script_tag in script_tags:
-                    data = json.loads(script_tag.string)  # Parse the JSON data
-                    if data.get('@type') == 'NewsArticle' and 'image' in data and len(data['image']) > 0:
-                        entry['image_url'] = data['image'][0]['url']  # Get the image URL
-                        break  # Exit the loop once the image URL is found
-            article = Article.query.filter_by(url=entry.link).first()
-            # If not, create a new Article instance and add it to the database
-            if article is None:
-                if 'published_parsed' in entry:
-                    published_date = datetime(*entry.published_parsed[:6])  # Convert time_struct to datetime
-                else:
-                    published_date = datetime.now()
-                article = Article(
-                    title=entry.title,
-                    url=entry.link,
-                    published_date=published_date  
-                )
-                db.session.add(article)
-                db.session.flush()  # Flush the session to assign an ID to the article
-            # Add the Article instance to the entry
-            entry['article'] = article
-            entries.append(entry)
-            articles.append(article)
-            # Check if the article is in the database
-            #article_in_db = Article.query.get(article.id)
-            #if article_in_db is not None:
-                #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-            #else:
-                #print(f"Article is not in the database: {article.id}")  # Debug statemente database
-    db.session.commit()
+                entry['image_url'] = page_image(entry.link, fields[entry.link])
+            entries.append(FeedEntry.from_entry(entry))
+    # Look up or create the Article rows of all entries at once
+    articles = attach_articles(entries)
     # Sort the entries based on their published time
     entries = sorted(entries, key=lambda e: e.published_parsed, reverse=True)
     return render_template('All_agencies/NHK.html', feed=entries,articles=articles)
 
 @app.route("/日テレNEWS_NNN")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def 日テレNEWS_NNN():
-    feed = feedparser.parse('https://news.ntv.co.jp/rss/index.rdf')
-    articles = []  # Initialize the articles list
+    feed, _ = fetch_feed('https://news.ntv.co.jp/rss/index.rdf')
     entries = []  # Initialize the entries list
+    fields = fetch_page_fields(entry.link for entry in feed.entries[:20])  # Extract all article pages concurrently
     for i, entry in enumerate(feed.entries):
         if i >= 20:  
             break
-        response = requests.get(entry.link)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        image_tag = soup.find('img')
-        if image_tag is not None:
-            entry['image_url'] = image_tag['src']
-        else:
-            entry['image_url'] = 'https://www.ntv.co.jp/assets/images/meta/og-image.png'
-         # Find the <p> tag with class 'player-text' and extract its text
-        p_tag = soup.find('p', class_='player-text')
-        if p_tag is not None:
-            lines = p_tag.get_text(separator='\n').split('\n')
-            entry['summary'] = '\n'.join(lines[:2]) + '...'   
-        # Check if an article with the same URL already exists in the database
-        article = Article.query.filter_by(url=entry.link).first()
-         # If not, create a new Article instance and add it to the database
-        if article is None:
-            try:
-                published_date = parse(entry.dc_date)  # Parse the 'dc:date' element into a datetime object
-            except (AttributeError, ValueError):
-                published_date = datetime.now()
-            article = Article(
-                title=entry.title,
-                url=entry.link,
-                published_date=published_date  # Convert time_struct to datetime
-            )
-            db.session.add(article)
-            db.session.flush()  # Flush the session to assign an ID to the article     
-        # Add the Article instance to the entry
-        entry['article'] = article
-        entries.append(entry)
-        articles.append(article)
-        # Check if the article is in the database
-        #article_in_db = Article.query.get(article.id)
-        #if article_in_db is not None:
-            #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-        #else:
-            #print(f"Article is not in the database: {article.id}")  # Debug statemente database
-    db.session.commit()
-
-    # Sort the entries based on their published time
-    entries = sorted(entries, key=lambda e: parse(e.dc_date) if hasattr(e, 'dc_date') else datetime.now(), reverse=True)
-    return render_template('All_agencies/日テレNEWS_NNN.html', feed=feed.entries[:20],articles=articles)
+        enrich_entry(entry, fields[entry.link])  # Image and teaser of the article
+        entries.append(FeedEntry.from_entry(entry))
+    # Look up or create the Article rows of all entries at once
+    articles = attach_articles(entries)
+    return render_template('All_agencies/日テレNEWS_NNN.html', feed=entries, articles=articles)  # In the order of the feed
 
 @app.route("/Al_Jazeera")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def Al_Jazeera():
-    feed = feedparser.parse('https://www.aljazeera.com/xml/rss/all.xml')
+    feed, _ = fetch_feed('https://www.aljazeera.com/xml/rss/all.xml')
     entries = []  # Initialize the entries list
-    articles = []  # Initialize the articles list
+    fields = fetch_page_fields(entry.link for entry in feed.entries)  # Extract all article pages concurrently
     for entry in feed.entries:
-        response = requests.get(entry.link)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        script_tags = soup.find_all('script', type='application/ld+json')
-        for script_tag in script_tags:
-            data = json.loads(script_tag.string)
-            if 'image' in data and isinstance(data['image'], list) and 'url' in data['image'][0]:
-                entry['image_url'] = data['image'][0]['url']
-                break  # Break the loop as soon as an image URL is found
-        else:
-            # This will only be executed if the loop didn't break, i.e., no image URL was found
-            entry['image_url'] = 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQ9sXvoSpXCYsdA1qW74Q3uGp8CAN19bUWGoQ&s'
+        entry['image_url'] = page_image(entry.link, fields[entry.link])
         entry['summary'] = html.unescape(entry['summary'])
-        # Check if an article with the same URL already exists in the database
-        article = Article.query.filter_by(url=entry.link).first()
-        # If not, create a new Article instance and add it to the database
-        if article is None:
-            if 'published_parsed' in entry:
-                published_date = datetime(*entry.published_parsed[:6])  # Convert time_struct to datetime
-            else:
-                published_date = datetime.now()
-            article = Article(
-                title=entry.title,
-                url=entry.link,
-                published_date=published_date  
-            )
-            db.session.add(article)
-            db.session.flush()  # Flush the session to assign an ID to the article
-        # Add the Article instance to the entry
-        entry['article'] = article
-        entries.append(entry)
-        articles.append(article)
-    db.session.commit()
-    return render_template('All_agencies/Al_Jazeera.html', feed=feed.entries,articles=articles)
-
-#creating or retrieving an Article instance for a given entry to avoid redudency.
-def get_article(entry, feed_url):
-    url = entry.link if 'link' in entry else entry.path
-    article = Article.query.filter_by(url=url).first()
-    if article is None:
-        if 'published_parsed' in entry:
-            published_date = datetime(*entry.published_parsed[:6])  # Convert time_struct to datetime
-        else:
-            published_date = datetime.now()
-        article = Article(
-            title=entry.title,
-            url=url,
-            published_date=published_date  
-        )
-        db.session.add(article)
-        db.session.flush()  # Flush the session to assign an ID to the article
-    return article
+        entries.append(FeedEntry.from_entry(entry))
+    # Look up or create the Article rows of all entries at once
+    articles = attach_articles(entries)
+    return render_template('All_agencies/Al_Jazeera.html', feed=entries, articles=articles)
+
+#Date an Article is stored with: the feed's published date, else its dc:date, else now
+def entry_published_date(entry):
+    if 'published_parsed' in entry:
+        return datetime(*entry.published_parsed[:6])  # Convert time_struct to datetime
+    if 'dc_date' in entry:
+        try:
+            return parse(entry.dc_date)  # Parse the 'dc:date' element into a datetime object
+        except (ValueError, ParserError):
+            pass
+    return datetime.now()
+
+#Insert statement that skips rows whose url_key already exists (inserted meanwhile by another request or worker)
+def insert_ignoring_duplicates(model):
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(model).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+        return postgresql_insert(model).on_conflict_do_nothing()
+    return insert(model).prefix_with('IGNORE')  # MySQL
+
+#Looks up the Articles of all entries with one IN (...) query and creates the missing ones with a single multi-row INSERT.
+#Sets entry['article'] and returns the articles in the order of the entries
+def attach_articles(entries):
+    entries_by_key = {}
+    for entry in entries:
+        entries_by_key.setdefault(normalize_url(entry.link if 'link' in entry else entry.path), entry)
+    existing_keys = set(db.session.scalars(select(Article.url_key).where(Article.url_key.in_(entries_by_key))))
+    missing = [{'title': entry.title, 'url': entry.link if 'link' in entry else entry.path, 'url_key': url_key,
+                'published_date': entry_published_date(entry)}
+               for url_key, entry in entries_by_key.items() if url_key not in existing_keys]
+    if missing:
+        db.session.execute(insert_ignoring_duplicates(Article), missing)
+        db.session.commit()
+    # Loaded after the commit, so rendering entry.article.id does not reload every row
+    articles_by_key = {article.url_key: article for article in Article.query.filter(Article.url_key.in_(entries_by_key))}
+    articles = []
+    for entry in entries:
+        entry['article'] = articles_by_key[normalize_url(entry.link if 'link' in entry else entry.path)]
+        articles.append(entry['article'])
+    return articles
 
 @app.route("/SDGs")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def SDGs():
     feeds = [
         'https://news.un.org/feed/subscribe/en/news/topic/sdgs/feed/rss.xml',
@@ -1030,8 +2164,10 @@ def SDGs():
         'https://www.unep.org/news-and-stories/rss.xml'
     ]
     entries = []
-    for feed_url in feeds:
-        feed = feedparser.parse(feed_url)
+    parsed_feeds = [(feed_url, fetch_feed(feed_url)[0]) for feed_url in feeds]
+    # Only the www.un.org pages have to be downloaded, all at once
+    fields = fetch_page_fields(entry.link for feed_url, feed in parsed_feeds if 'www.un.org' in feed_url for entry in feed.entries[:10])
+    for feed_url, feed in parsed_feeds:
         for entry in feed.entries[:10]:
             if 'news.un.org' in feed_url:
                 image_url = entry.links[1].href if len(entry.links) > 1 else None
@@ -1048,22 +2184,7 @@ def SDGs():
                     summary = None
                 publish_date = entry.created if 'created' in entry else None
             else:
-                try:
-                    response = requests.get(entry.link, timeout=30)
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    div = soup.find('div', class_='story-media')
-                    if div:
-                        picture = div.find('picture')
-                        if picture:
-                            img = picture.find('img')
-                            image_url = img['src'] if img else None
-                        else:
-                            image_url = None
-                    else:
-                        image_url = None
-                except Timeout:
-                    print("The request timed out")
-                    image_url = None
+                image_url = fields[entry.link]['image_url']
                 summary = entry.summary_detail.value if 'summary_detail' in entry else None
                 publish_date = entry.published if 'published' in entry else None
                 original_link = entry.link
@@ -1079,22 +2200,15 @@ def SDGs():
                     publish_date = None
             entry['publish_date'] = publish_date
             entry['original_link'] = original_link  # store the original link in the entry
-            entries.append(entry)
-            article = get_article(entry, feed_url)
-            entry['article'] = article
-            # Check if the article is in the database
-            #article_in_db = Article.query.get(article.id)
-            #if article_in_db is not None:
-                #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-            #else:
-                #print(f"Article is not in the database: {article.id}")  # Debug statement
-    db.session.commit()
+            entries.append(FeedEntry.from_entry(entry))
+    # Look up or create the Article rows of all entries at once
+    attach_articles(entries)
     # Sort the entries based on their published time
     entries = sorted(entries, key=lambda e: (e['publish_date'] is None, e['publish_date']), reverse=True)
     return render_template('All_contents/SDGs.html', entries=entries)
 
 @app.route("/Politics")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def Politics():
     feeds = [
         'http://feeds.bbci.co.uk/news/politics/rss.xml',
@@ -1103,23 +2217,16 @@ def Politics():
         'http://rss.politico.com/defense.xml'
     ]
     entries = []
-    articles = []
-    for feed_url in feeds:
-        feed = feedparser.parse(feed_url)
+    parsed_feeds = [(feed_url, fetch_feed(feed_url)[0]) for feed_url in feeds]
+    # BBC pages are always needed, POLITICO pages only when the feed has no image
+    fields = fetch_page_fields(entry.link for feed_url, feed in parsed_feeds for entry in feed.entries[:8]
+                        if 'feeds.bbci.co.uk' in feed_url
+                        or ('rss.politico.com' in feed_url and not entry.get('media_content')))
+    for feed_url, feed in parsed_feeds:
         for i, entry in enumerate(feed.entries):
             if i < 8:  # Only process the first 6 entries
                 if 'feeds.bbci.co.uk' in feed_url:
-                    if 'media_thumbnail' in entry and len(entry['media_thumbnail']) > 0:
-                        entry['image_url'] = entry['media_thumbnail'][0]['url']
-                    else:
-                        entry['image_url'] = 'https://upload.wikimedia.org/wikipedia/commons/thumb/e/ea/BBC_World_News_2022_%28Boxed%29.svg/800px-BBC_World_News_2022_%28Boxed%29.svg.png'
-                    response = requests.get(entry.link)
-                    soup = BeautifulSoup(response.text, 'html.parser') 
-                    # Find the <p> tag with class 'player-text' and extract its text
-                    p_tag = soup.find('p', class_='sc-eb7bd5f6-0 fYAfXe')
-                    if p_tag is not None:
-                        lines = p_tag.get_text(separator='\n').split('\n')
-                        entry['summary'] = '\n'.join(lines[:3]) + '...'
+                    enrich_entry(entry, fields[entry.link])  # Feed thumbnail and the teaser of the article
                 elif 'www.theguardian.com' in feed_url:
                     # Parsing logic for 'www.theguardian.com'
                     if 'media_content' in entry and len(entry['media_content']) > 0:
@@ -1134,23 +2241,8 @@ def Politics():
                     max_words = 75  # Set your desired maximum number of words
                     entry['summary'] = ' '.join(summary_words[:max_words]) + ',continued ... '
                 elif 'rss.politico.com' in feed_url:
-                    # Check if the entry has a 'media_content' field
-                    if 'media_content' in entry and len(entry['media_content']) > 0:
-                        # Get the image URL from the 'media_content' field
-                        entry['image_url'] = entry['media_content'][0]['url']
-                    else:
-                        # Make a GET request to the entry's link
-                        response = requests.get(entry.link)
-                        soup = BeautifulSoup(response.text, 'html.parser')
-                        # Find the first <img> tag with a 'data-lazy-img' attribute
-                        img_tag = soup.find('img', attrs={'data-lazy-img': True})
-                        if img_tag is not None:
-                            # Get the image URL from the 'data-lazy-img' attribute
-                            entry['image_url'] = img_tag['data-lazy-img']
-                        else:
-                            # Use a default image URL if no image URL was found
-                            entry['image_url'] = 'https://www.politico.eu/wp-content/themes/politico/assets/images/politico-billboard.png'
-                    entry['summary'] = entry.summary
+                    # The feed image, else the image of the page (only downloaded when the feed has none)
+                    enrich_entry(entry, fields.get(entry.link, EMPTY_PAGE_FIELDS))
                 publish_date = entry.get('published')            
                 if publish_date:
                     try:
@@ -1161,22 +2253,15 @@ def Politics():
                         print(f"Could not parse date: {publish_date}")
                         publish_date = None
                 entry['publish_date'] = publish_date
-                entries.append(entry)
-                article = get_article(entry, feed_url)
-                entry['article'] = article
-                # Check if the article is in the database
-                #article_in_db = Article.query.get(article.id)
-                #if article_in_db is not None:
-                    #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-                #else:
-                    #print(f"Article is not in the database: {article.id}")  # Debug statement
-    db.session.commit()
+                entries.append(FeedEntry.from_entry(entry))
+    # Look up or create the Article rows of all entries at once
+    attach_articles(entries)
     # Sort the entries based on their published time
     entries = sorted(entries, key=lambda e: (e['publish_date'] is None, e['publish_date']), reverse=True)
     return render_template('All_contents/Politics.html', entries=entries)
 
 @app.route("/Economy")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def Economy():
     feeds = [
         'https://www.economist.com/finance-and-economics/rss.xml',
@@ -1185,42 +2270,19 @@ def Economy():
         'https://search.cnbc.com/rs/search/combinedcms/view.xml?partnerId=wrss01&id=20910258'
     ]
     entries = []
-    for feed_url in feeds:
-        feed = feedparser.parse(feed_url)
+    parsed_feeds = [(feed_url, fetch_feed(feed_url)[0]) for feed_url in feeds]
+    # Every source except POLITICO needs its article pages, download them all at once
+    fields = fetch_page_fields(entry.link for feed_url, feed in parsed_feeds if 'rss.politico.com' not in feed_url for entry in feed.entries[:8])
+    for feed_url, feed in parsed_feeds:
         for entry in feed.entries[:8]:
-            if 'www.nhk.or.jp' in feed_url:
-                response = requests.get(entry.link)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                entry['image_url'] = 'https://upload.wikimedia.org/wikipedia/commons/4/4c/NHK_logo_2020.svg'
-                script_tags = soup.find_all('script', type='application/ld+json')  # Find all script tags with type 'application/ld+json'
-                for script_tag in script_tags:
-                    data = json.loads(script_tag.string)  # Parse the JSON data
-                    if data.get('@type') == 'NewsArticle' and 'image' in data and len(data['image']) > 0:
-                        entry['image_url'] = data['image'][0]['url']  # Get the image URL
-                        break  # Exit the loop once the image URL is found
-            elif 'rss.politico.com' in feed_url:
+            if 'rss.politico.com' in feed_url:
                 # Check if the entry has a 'media_content' field
                 if 'media_content' in entry and len(entry['media_content']) > 0:
                     # Get the image URL from the 'media_content' field
                     entry['image_url'] = entry['media_content'][0]['url']
-            elif 'search.cnbc.com' in feed_url:
-                response = requests.get(entry.link)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                script_tag = soup.find('script', type='application/ld+json')
-                if script_tag:
-                    data = json.loads(script_tag.string)
-                    entry['image_url'] = data.get('image', {}).get('url', 'https://upload.wikimedia.org/wikipedia/commons/4/4c/CNBC_logo.svg')
-                else:
-                    entry['image_url'] = 'https://sc.cnbcfm.com/applications/cnbc.com/staticcontent/img/cnbc_logo.gif'
-            elif 'www.economist.com' in feed_url:
-                response = requests.get(entry.link)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                script_tag = soup.find('script', type='application/ld+json')
-                if script_tag:
-                    data = json.loads(script_tag.string)
-                    entry['image_url'] = data.get('image', 'https://upload.wikimedia.org/wikipedia/commons/4/4c/Politico_logo.svg')
-                else:
-                    entry['image_url'] = 'https://upload.wikimedia.org/wikipedia/commons/4/4c/Politico_logo.svg'
+            else:
+                # NHK, CNBC and The Economist: the image found in the article page (see SOURCES)
+                entry['image_url'] = page_image(entry.link, fields[entry.link])
             publish_date = entry.get('published')
             if publish_date:
                 try:
@@ -1231,22 +2293,15 @@ def Economy():
                     print(f"Could not parse date: {publish_date}")
                     publish_date = None
             entry['publish_date'] = publish_date
-            entries.append(entry)
-            article = get_article(entry, feed_url)
-            entry['article'] = article
-            # Check if the article is in the database
-            #article_in_db = Article.query.get(article.id)
-            #if article_in_db is not None:
-                #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-            #else:
-                #print(f"Article is not in the database: {article.id}")  # Debug statement
-    db.session.commit()
+            entries.append(FeedEntry.from_entry(entry))
+    # Look up or create the Article rows of all entries at once
+    attach_articles(entries)
     # Sort the entries based on their published time
     entries = sorted(entries, key=lambda e: (e['publish_date'] is None, e['publish_date']), reverse=True)
     return render_template('All_contents/Economy.html', entries=entries)
 
 @app.route("/Environment")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def Environment():
     feeds = [
         'https://www.theguardian.com/uk/environment/rss',
@@ -1254,8 +2309,10 @@ def Environment():
         'https://www.enn.com/?layout=ja_teline_v:taggedblog&types[0]=1&format=feed&type=rss'
     ]
     entries = []
-    for feed_url in feeds:
-        feed = feedparser.parse(feed_url)
+    parsed_feeds = [(feed_url, fetch_feed(feed_url)[0]) for feed_url in feeds]
+    # The Guardian feed carries its own images, the other sources need their article pages
+    fields = fetch_page_fields(entry['link'] for feed_url, feed in parsed_feeds if 'theguardian.com' not in feed_url for entry in feed.entries[:10])
+    for feed_url, feed in parsed_feeds:
         for entry in feed.entries[:10]:
             if 'theguardian.com' in feed_url:
                 if 'media_content' in entry and len(entry['media_content']) > 0:
@@ -1269,41 +2326,9 @@ def Environment():
                 summary_words = summary_text.split()  # Split the text by spaces to get a list of words
                 max_words = 75  # Set your desired maximum number of words
                 entry['summary'] = ' '.join(summary_words[:max_words]) + ',continued ... '
-            elif 'insideclimatenews.org' in feed_url:
-                response = requests.get(entry['link'])
-                # Parse the HTML content of the page
-                soup = BeautifulSoup(response.text, 'html.parser')
-                # Find the script tag with type="application/ld+json"
-                json_script = soup.find('script', type='application/ld+json')
-                if json_script:
-                    # Parse the JSON content
-                    data = json.loads(json_script.string)
-                    # Find the image URL in the JSON data
-                    image_url = data.get('@graph', [{}])[0].get('thumbnailUrl')
-                    if image_url:
-                        # If an image URL is found, use it
-                        entry['image_url'] = image_url
-                    else:
-                        # If no image URL is found, use a default image URL
-                        entry['image_url'] = 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcRQeKvQEJ5MwuooBe6-7nPSkDtezs7VbncS__YFxOB5Dkqioa-8fZpzEYYLKC9FtsQ1OKM&usqp=CAU'
-                else:
-                    # If no script tag is found, use a default image URL
-                    entry['image_url'] = 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcRQeKvQEJ5MwuooBe6-7nPSkDtezs7VbncS__YFxOB5Dkqioa-8fZpzEYYLKC9FtsQ1OKM&usqp=CAU'
-            elif 'enn.com' in feed_url:
-                # Send a GET request to the article page
-                response = requests.get(entry['link'])
-                # Parse the HTML content of the page
-                soup = BeautifulSoup(response.text, 'html.parser')
-                # Find the span tag with itemprop="image"
-                image_span = soup.find('span', itemprop='image')
-                # Find the img tag within the span tag
-                image_tag = image_span.find('img') if image_span else None
-                if image_tag and 'src' in image_tag.attrs:
-                    # If an image tag is found, use its 'src' attribute as the image URL
-                    entry['image_url'] = "https:" + image_tag['src']  # prepend "https:" to the src attribute
-                else:
-                    # If no image tag is found, use a default image URL
-                    entry['image_url'] = 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcRQeKvQEJ5MwuooBe6-7nPSkDtezs7VbncS__YFxOB5Dkqioa-8fZpzEYYLKC9FtsQ1OKM&usqp=CAU'
+            else:
+                # Inside Climate News and ENN: the image found in the article page (see SOURCES)
+                entry['image_url'] = page_image(entry['link'], fields[entry['link']])
             publish_date = entry.get('published')
             if publish_date:
                 try:
@@ -1314,22 +2339,15 @@ def Environment():
                     print(f"Could not parse date: {publish_date}")
                     publish_date = None
             entry['publish_date'] = publish_date
-            entries.append(entry)  # Add this line
-            article = get_article(entry, feed_url)
-            entry['article'] = article
-            # Check if the article is in the database
-            #article_in_db = Article.query.get(article.id)
-            #if article_in_db is not None:
-                #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-            #else:
-                #print(f"Article is not in the database: {article.id}")  # Debug statement
-    db.session.commit()
+            entries.append(FeedEntry.from_entry(entry))  # Add this line
+    # Look up or create the Article rows of all entries at once
+    attach_articles(entries)
     # Sort the entries based on their published time
     entries = sorted(entries, key=lambda e: (e['publish_date'] is None, e['publish_date']), reverse=True)
     return render_template('All_contents/Environment.html', entries=entries)
 
 @app.route("/Science_and_Health")
-@cache.cached(timeout=900)
+@stale_while_revalidate
 def Science_and_Health():
     feeds = [
         'https://rssfeeds.webmd.com/rss/rss.aspx?RSSSource=RSS_PUBLIC',
@@ -1337,31 +2355,15 @@ def Science_and_Health():
         'https://www.nhk.or.jp/rss/news/cat3.xml'
     ]
     entries = []
-    for feed_url in feeds:
-        feed = feedparser.parse(feed_url)
+    parsed_feeds = [(feed_url, fetch_feed(feed_url)[0]) for feed_url in feeds]
+    # WebMD entries carry their own images, the other sources need their article pages
+    fields = fetch_page_fields(entry.link for feed_url, feed in parsed_feeds if 'rssfeeds.webmd.com' not in feed_url for entry in feed.entries[:10])
+    for feed_url, feed in parsed_feeds:
         for entry in feed.entries[:10]:
             if 'www.nhk.or.jp' in feed_url:
-                response = requests.get(entry.link)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                entry['image_url'] = 'https://upload.wikimedia.org/wikipedia/commons/4/4c/NHK_logo_2020.svg'
-                script_tags = soup.find_all('script', type='application/ld+json')  # Find all script tags with type 'application/ld+json'
-                for script_tag in script_tags:
-                    data = json.loads(script_tag.string)  # Parse the JSON data
-                    if data.get('@type') == 'NewsArticle' and 'image' in data and len(data['image']) > 0:
-                        entry['image_url'] = data['image'][0]['url']  # Get the image URL
-                        break  # Exit the loop once the image URL is found
+                entry['image_url'] = page_image(entry.link, fields[entry.link])
             elif 'feeds.bbci.co.uk' in feed_url:
-                    if 'media_thumbnail' in entry and len(entry['media_thumbnail']) > 0:
-                        entry['image_url'] = entry['media_thumbnail'][0]['url']
-                    else:
-                        entry['image_url'] = 'https://upload.wikimedia.org/wikipedia/commons/thumb/e/ea/BBC_World_News_2022_%28Boxed%29.svg/800px-BBC_World_News_2022_%28Boxed%29.svg.png'
-                    response = requests.get(entry.link)
-                    soup = BeautifulSoup(response.text, 'html.parser') 
-                    # Find the <p> tag with class 'player-text' and extract its text
-                    p_tag = soup.find('p', class_='sc-eb7bd5f6-0 fYAfXe')
-                    if p_tag is not None:
-                        lines = p_tag.get_text(separator='\n').split('\n')
-                        entry['summary'] = '\n'.join(lines[:3]) + '...'
+                enrich_entry(entry, fields[entry.link])  # Feed thumbnail and the teaser of the article
             elif 'rssfeeds.webmd.com' in feed_url: 
                 if 'media_content' in entry and len(entry['media_content']) > 0:
                     entry['image_url'] = entry['media_content'][0]['url']
@@ -1380,20 +2382,175 @@ def Science_and_Health():
                     print(f"Could not parse date: {publish_date}")
                     publish_date = None
             entry['publish_date'] = publish_date
-            entries.append(entry)  # Add this line
-            article = get_article(entry, feed_url)
-            entry['article'] = article
-            # Check if the article is in the database
-            #article_in_db = Article.query.get(article.id)
-            #if article_in_db is not None:
-                #print(f"Article is in the database: {article_in_db.id}")  # Debug statement
-            #else:
-                #print(f"Article is not in the database: {article.id}")  # Debug statement
-    db.session.commit()
+            entries.append(FeedEntry.from_entry(entry))  # Add this line
+    # Look up or create the Article rows of all entries at once
+    attach_articles(entries)
     # Sort the entries based on their published time
     entries.sort(key=lambda entry: entry['publish_date'], reverse=True)  # Sort the entries by publish_date in descending order        
     return render_template('All_contents/Science_and_Health.html', entries=entries)
 
+#Fixed article set used to compare the fp32 and int8 summarization paths
+BENCHMARK_ARTICLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'summary_articles.json')
+
+#ROUGE-1, ROUGE-2 and ROUGE-L F1 of a candidate token list against a reference token list
+def rouge_scores(candidate, reference):
+    def f1(overlap, candidate_total, reference_total):
+        if overlap == 0:
+            return 0.0
+        precision, recall = overlap / candidate_total, overlap / reference_total
+        return 2 * precision * recall / (precision + recall)
+    scores = {}
+    for n in (1, 2):
+        candidate_ngrams = Counter(zip(*[candidate[i:] for i in range(n)]))
+        reference_ngrams = Counter(zip(*[reference[i:] for i in range(n)]))
+        overlap = sum((candidate_ngrams & reference_ngrams).values())
+        scores[f'rouge{n}'] = f1(overlap, sum(candidate_ngrams.values()), sum(reference_ngrams.values()))
+    # Longest common subsequence, one row at a time
+    previous = [0] * (len(reference) + 1)
+    for token in candidate:
+        current = [0]
+        for j, reference_token in enumerate(reference):
+            current.append(previous[j] + 1 if token == reference_token else max(previous[j + 1], current[j]))
+        previous = current
+    scores['rougeL'] = f1(previous[-1], len(candidate), len(reference))
+    return scores
+
+#Compares latency, memory and ROUGE (against the fp32 summaries) of the quantized models: flask --app app benchmark-quantization
+@app.cli.command('benchmark-quantization')
+@click.option('--articles', default=BENCHMARK_ARTICLES, help='JSON file mapping a model name to a list of articles')
+@click.option('--runs', default=3, help='Number of timed runs per article')
+def benchmark_quantization(articles, runs):
+    with open(articles, encoding='utf-8') as f:
+        article_set = json.load(f)
+    for name, texts in article_set.items():
+        fp32_model, tokenizer = load_summary_model(name)
+        int8_model = quantize_model(fp32_model)  # quantize_dynamic works on a copy
+        limit = model_input_limit(fp32_model, tokenizer)
+        max_length = summary_max_length(fp32_model)
+        results = {}
+        for label, model in (('fp32', fp32_model), ('int8', int8_model)):
+            latencies, summaries = [], []
+            for text in texts:
+                chunks = chunk_article(text, tokenizer, limit)
+                generate_summaries(model, tokenizer, chunks, max_length)  # Warm-up run
+                start = time.perf_counter()
+                for _ in range(runs):
+                    summary = ' '.join(generate_summaries(model, tokenizer, chunks, max_length))
+                latencies.append((time.perf_counter() - start) / runs)
+                summaries.append(summary)
+            results[label] = (latencies, summaries, model_memory_bytes(model))
+
+        # Japanese has no spaces between words, so ROUGE is computed on characters
+        split = (lambda text: list(text.replace(' ', ''))) if name == 'japanese' else str.split
+        click.echo(f"{name} ({SUMMARY_MODELS[name][0]}), {len(texts)} articles, {runs} runs each")
+        for label, (latencies, summaries, memory_bytes) in results.items():
+            scores = [rouge_scores(split(summary), split(reference)) for summary, reference in zip(summaries, results['fp32'][1])]
+            averages = {key: sum(score[key] for score in scores) / len(scores) for key in ('rouge1', 'rouge2', 'rougeL')}
+            click.echo(f"  {label}: {sum(latencies) / len(latencies):.2f}s per article, {memory_bytes / 2**20:.0f} MB weights, "
+                       f"ROUGE-1 {averages['rouge1']:.3f} / ROUGE-2 {averages['rouge2']:.3f} / ROUGE-L {averages['rougeL']:.3f} vs fp32")
+
+#Size of a cached value and the memory a worker allocates to load it
+def loaded_size(value):
+    data = pickle.dumps(value)
+    tracemalloc.start()
+    loaded = pickle.loads(data)
+    memory_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del loaded
+    return len(data), memory_bytes
+
+#Compares the cache size and worker memory of the feed entries as FeedEntry records and as feedparser entries:
+#flask --app app benchmark-entry-memory
+@app.cli.command('benchmark-entry-memory')
+@click.option('--url', 'urls', multiple=True, help='Feed to measure, every feed of the home page by default')
+def benchmark_entry_memory(urls):
+    totals = {'feedparser': [0, 0], 'FeedEntry': [0, 0]}
+    for url in urls or URLS:
+        feed, _ = fetch_feed(url)
+        if not feed.entries:
+            click.echo(f"{url}: no entries")
+            continue
+        results = {'feedparser': loaded_size(feed.entries),
+                   'FeedEntry': loaded_size([FeedEntry.from_entry(entry) for entry in feed.entries])}
+        click.echo(f"{url}: {len(feed.entries)} entries")
+        for label, (size, memory_bytes) in results.items():
+            totals[label][0] += size
+            totals[label][1] += memory_bytes
+            click.echo(f"  {label}: {size / 1024:.1f} KB pickled, {memory_bytes / 1024:.1f} KB loaded")
+    for label, (size, memory_bytes) in totals.items():
+        click.echo(f"Total {label}: {size / 1024:.1f} KB pickled, {memory_bytes / 1024:.1f} KB loaded")
+
+#Fixture feeds and article pages served on 127.0.0.1 by check-ingest-blocking, so the check does not depend
+#on the live feeds. The article pages are large enough that parsing one on the event loop would show up
+INGEST_CHECK_FEEDS = 4
+INGEST_CHECK_ENTRIES = 10
+INGEST_CHECK_PARAGRAPHS = 2000
+
+def ingest_check_server():
+    async def feed(request):
+        base = f'http://{request.host}'
+        name = request.match_info['name']
+        published = email.utils.formatdate(usegmt=True)  # parse_feed skips entries older than 24 hours
+        items = ''.join(f'<item><title>Article {name}-{i}</title><link>{base}/article/{name}-{i}</link>'
+                        f'<description>Summary of article {name}-{i}</description><pubDate>{published}</pubDate></item>'
+                        for i in range(INGEST_CHECK_ENTRIES))
+        return web.Response(text=f'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed {name}</title>{items}</channel></rss>',
+                            content_type='application/rss+xml')
+
+    async def article(request):
+        paragraphs = ''.join(f'<p>Paragraph {i} of the article.</p>' for i in range(INGEST_CHECK_PARAGRAPHS))
+        return web.Response(text=f'<html><head><title>Article</title></head><body><img src="/image.png">'
+                                 f'<p class="teaser">Teaser</p>{paragraphs}</body></html>', content_type='text/html')
+
+    server = web.Application()
+    server.router.add_get('/feed/{name}.xml', feed)
+    server.router.add_get('/article/{name}', article)
+    return server
+
+#Refreshes the fixture feeds (feed download, feedparser, article pages, BeautifulSoup and cache writes) and fails
+#when the event loop was blocked for longer than the threshold or when a feed was not refreshed. A blocking call is
+#run under the watchdog first, the check fails if it is not caught. Run it after changing the ingest pipeline:
+#flask --app app check-ingest-blocking
+@app.cli.command('check-ingest-blocking')
+@click.option('--threshold', default=LOOP_LAG_THRESHOLD, show_default=True, help='Max seconds the event loop may be blocked.')
+def check_ingest_blocking(threshold):
+    async def blocking_call():
+        time.sleep(threshold * 2)
+
+    async def check():
+        runner = web.AppRunner(ingest_check_server(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', 0).start()
+        host = f'127.0.0.1:{runner.addresses[0][1]}'
+        urls = [f'http://{host}/feed/{n}.xml' for n in range(INGEST_CHECK_FEEDS)]
+        SOURCES[host] = {'image': [('img', 'src')], 'teaser': ('p.teaser', 1)}  # The article pages are downloaded
+        blocked, stats = {'max': 0.0, 'warnings': 0}, {'max': 0.0, 'warnings': 0}
+        try:
+            await watched(blocking_call(), blocked)
+            await watched(asyncio.gather(*(fetch_and_parse(url) for url in urls)), stats)
+            refreshed = {url: cache.get(url) for url in urls}
+        finally:
+            del SOURCES[host]
+            await runner.cleanup()
+        # The fixture is not kept in the cache nor in the page store
+        for url, entries in refreshed.items():
+            for prefix in ('', FEED_BUILT_FROM_PREFIX, FEED_REFRESHED_PREFIX, FEED_STORE_PREFIX):
+                cache.delete(prefix + url)
+            for entry in entries or []:
+                page_store.delete(entry.link)
+        return blocked, stats, [url for url, entries in refreshed.items() if entries]
+
+    blocked, stats, refreshed = asyncio.run(check())
+    if blocked['max'] <= threshold:
+        raise click.ClickException(f"The watchdog missed a {threshold * 2:.3f}s blocking call")
+    print(f"Refreshed {len(refreshed)} of {INGEST_CHECK_FEEDS} fixture feeds")
+    if len(refreshed) < INGEST_CHECK_FEEDS:
+        raise click.ClickException('The fixture feeds were not refreshed, nothing was checked')
+    print(f"Largest event loop lag: {stats['max']:.3f}s (threshold {threshold:.3f}s)")
+    if stats['max'] > threshold:
+        raise click.ClickException('The ingest pipeline blocked the event loop')
+    print("The ingest pipeline never blocked the event loop")
+
 # Create an ASGI app using the WsgiToAsgi adapter
 ASGI_app = WsgiToAsgi(app)
 print("ASGI app created successfully...")
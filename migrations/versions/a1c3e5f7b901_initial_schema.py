@@ -0,0 +1,56 @@
+"""initial schema
+
+Revision ID: a1c3e5f7b901
+Revises: 
+Create Date: 2026-10-18 16:40:12.104512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f7b901'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created before migrations were added already have these tables (made by db.create_all())
+    existing_tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'article' not in existing_tables:
+        op.create_table('article',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.Column('published_date', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'comment' not in existing_tables:
+        op.create_table('comment',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.String(length=500), nullable=False),
+        sa.Column('article_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['article_id'], ['article.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'summary' not in existing_tables:
+        op.create_table('summary',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.Column('model_name', sa.String(length=20), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('summary', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('checked_at', sa.DateTime(), nullable=False),
+        sa.Column('last_used', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('url', 'model_name')
+        )
+
+
+def downgrade():
+    op.drop_table('summary')
+    op.drop_table('comment')
+    op.drop_table('article')
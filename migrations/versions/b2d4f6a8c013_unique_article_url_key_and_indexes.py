@@ -0,0 +1,69 @@
+"""unique article url_key and indexes
+
+Revision ID: b2d4f6a8c013
+Revises: a1c3e5f7b901
+Create Date: 2026-10-18 16:52:47.630981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import urllib.parse
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d4f6a8c013'
+down_revision = 'a1c3e5f7b901'
+branch_labels = None
+depends_on = None
+
+
+# Copy of normalize_url() in app.py at the time of this migration
+def normalize_url(url):
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = 'https' if parts.scheme.lower() in ('http', 'https') else parts.scheme.lower()
+    query = urllib.parse.urlencode([(key, value) for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+                                    if not key.lower().startswith('utm_')])
+    return urllib.parse.urlunsplit((scheme, parts.netloc.lower(), parts.path.rstrip('/') or '/', query, ''))
+
+
+def upgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('url_key', sa.String(length=500), nullable=True))
+
+    # Fill url_key and merge the duplicate articles created by the old insert path:
+    # the oldest row of each URL is kept and the comments of the others are moved to it
+    bind = op.get_bind()
+    article = sa.table('article', sa.column('id', sa.Integer), sa.column('url', sa.String), sa.column('url_key', sa.String))
+    comment = sa.table('comment', sa.column('article_id', sa.Integer))
+    kept_ids = {}
+    keys, duplicates = [], []
+    for article_id, url in bind.execute(sa.select(article.c.id, article.c.url).order_by(article.c.id)):
+        url_key = normalize_url(url)
+        if url_key in kept_ids:
+            duplicates.append({'duplicate_id': article_id, 'kept_id': kept_ids[url_key]})
+        else:
+            kept_ids[url_key] = article_id
+            keys.append({'article_id': article_id, 'key': url_key})
+    if duplicates:
+        bind.execute(comment.update().where(comment.c.article_id == sa.bindparam('duplicate_id'))
+                     .values(article_id=sa.bindparam('kept_id')), duplicates)
+        bind.execute(article.delete().where(article.c.id == sa.bindparam('duplicate_id')), duplicates)
+    if keys:
+        bind.execute(article.update().where(article.c.id == sa.bindparam('article_id'))
+                     .values(url_key=sa.bindparam('key')), keys)
+
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.alter_column('url_key', existing_type=sa.String(length=500), nullable=False)
+        batch_op.create_index(batch_op.f('ix_article_url_key'), ['url_key'], unique=True)
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_comment_article_id'), ['article_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_comment_article_id'))
+
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_article_url_key'))
+        batch_op.drop_column('url_key')
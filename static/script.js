@@ -7,6 +7,50 @@ button_click_me.onclick = function() {
 }
 
 var modal = document.getElementById("myModal");
+
+// Wait for a summary job to finish, over server-sent events when the browser supports them, by polling otherwise
+function waitForSummary(job) {
+    if (!window.EventSource) {
+        return pollSummary(job);
+    }
+    return new Promise(function(resolve, reject) {
+        var source = new EventSource(job.events_url);
+        source.onmessage = function(event) {
+            var data = JSON.parse(event.data);
+            if (data.status === 'done') {
+                source.close();
+                resolve(data);
+            } else if (data.status === 'error') {
+                source.close();
+                reject(new Error(data.error));
+            }
+        };
+        source.onerror = function() {
+            // The server ends every response, the browser reconnects by itself (CONNECTING).
+            // Fall back to polling only when it gave up (CLOSED)
+            if (source.readyState === EventSource.CLOSED) {
+                pollSummary(job).then(resolve, reject);
+            }
+        };
+    });
+}
+
+async function pollSummary(job) {
+    while (true) {
+        await new Promise(function(resolve) { setTimeout(resolve, 1000); });
+        var response = await fetch(job.status_url);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        var data = await response.json();
+        if (data.status === 'done') {
+            return data;
+        }
+        if (data.status === 'error') {
+            throw new Error(data.error);
+        }
+    }
+}
 var buttons_summary = document.getElementsByClassName("summary");
 var close = document.getElementById("close");
 
@@ -35,6 +79,10 @@ for (var i = 0; i < buttons_summary.length; i++) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             var data = await response.json();
+            // The summary is either cached and returned at once, or produced by a background job
+            if (data.summary === undefined) {
+                data = await waitForSummary(data);
+            }
             modalContent.textContent = data.summary ;
             modalContent.classList.remove('fade-text');  // Remove the animation class
 
@@ -62,23 +110,89 @@ window.onclick = function(event) {
   }
 }
 
-// Function to fetch and display comments
+// Cursors of the comments shown in the comment modal
+var newestCommentId = null;
+var oldestCommentId = null;
+
+// Create the div of a single comment
+function commentElement(comment) {
+    var commentDiv = $('<div class="comment"></div>');
+    commentDiv.append($('<p></p>').text(comment.content));
+    return commentDiv;
+}
+
+// Show or hide the button loading earlier comments
+function updateEarlierCommentsButton(articleId, hasMore) {
+    $('#earlier-comments').remove();
+    if (hasMore) {
+        var button = $('<button id="earlier-comments">Show earlier comments</button>');
+        button.click(function() {
+            fetchEarlierComments(articleId);
+        });
+        $('#comments').prepend(button);
+    }
+}
+
+// Function to fetch and display the newest comments
 function fetchComments(articleId) {
     $.ajax({
         url: '/articles/' + articleId + '/comments',
         method: 'GET',
-        success: function(comments) {
+        success: function(data) {
             // Clear any existing comments
             $('#comments').empty();
             // Add each comment to the comments section
-            comments.forEach(function(comment) {
-                // Create a new div for each comment
-                var commentDiv = $('<div class="comment"></div>');
-                // Add the comment text to the div
-                commentDiv.append('<p>' + comment + '</p>');  // Changed 'comment.content' to 'comment'
-                // Add the div to the comments section
-                $('#comments').append(commentDiv);
+            data.comments.forEach(function(comment) {
+                $('#comments').append(commentElement(comment));
+            });
+            newestCommentId = data.newest_id;
+            oldestCommentId = data.oldest_id;
+            updateEarlierCommentsButton(articleId, data.has_more);
+        },
+        error: function() {
+            alert('Failed to fetch comments');
+        }
+    });
+}
+
+// Function to fetch only the comments posted since the last fetch
+function fetchNewComments(articleId) {
+    if (newestCommentId === null) {
+        fetchComments(articleId);
+        return;
+    }
+    $.ajax({
+        url: '/articles/' + articleId + '/comments',
+        method: 'GET',
+        data: { after: newestCommentId },
+        success: function(data) {
+            data.comments.forEach(function(comment) {
+                $('#comments').append(commentElement(comment));
+            });
+            newestCommentId = data.newest_id;
+            if (data.has_more) {
+                fetchNewComments(articleId);
+            }
+        },
+        error: function() {
+            alert('Failed to fetch comments');
+        }
+    });
+}
+
+// Function to fetch the page of comments older than the ones shown
+function fetchEarlierComments(articleId) {
+    $.ajax({
+        url: '/articles/' + articleId + '/comments',
+        method: 'GET',
+        data: { before: oldestCommentId },
+        success: function(data) {
+            $('#earlier-comments').remove();
+            data.comments.slice().reverse().forEach(function(comment) {
+                $('#comments').prepend(commentElement(comment));
             });
+            oldestCommentId = data.oldest_id;
+            updateEarlierCommentsButton(articleId, data.has_more);
         },
         error: function() {
             alert('Failed to fetch comments');
@@ -132,8 +246,8 @@ $('#comment-form').submit(function(e) {
             showNotification('Comment posted successfully !');
             // Clear the comment form
             $('#comment_content').val('');
-            // Fetch and display comments
-            fetchComments(articleId);
+            // Fetch and display the comments that are new to us
+            fetchNewComments(articleId);
         },
         error: function() {
             // Show a temporary notification